@@ -0,0 +1,143 @@
+# Description: Adaptive Monte Carlo for sweeps. Instead of a fixed num_runs per configuration, auctions are simulated
+# chunk by chunk while running confidence intervals of the per-strategy win ratio, the mean winner Profit and the
+# mean efficiency are tracked, and a configuration stops as soon as all of them reach the target precision. Every
+# round only the configurations that have not converged get new chunks, so compute goes to the uncertain cells.
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from campaign import STRATEGY_LABELS
+from results import read_results, write_results
+from sweep import add_space_arguments, chunk_path, point_key, points_from_arguments, run_point_chunk, save_chunk
+
+# Half-widths of the confidence intervals a configuration has to reach
+DEFAULT_TARGETS = {'win_ratio': 0.01, 'Profit': 0.0001, 'efficiency': 0.005}
+
+MEAN_COLUMNS = ['Profit', 'efficiency']
+
+
+class OutcomeStats:
+    def __init__(self):
+        self.runs = 0
+        self.wins = dict.fromkeys(STRATEGY_LABELS, 0)
+        self.count = dict.fromkeys(MEAN_COLUMNS, 0)
+        self.sum = dict.fromkeys(MEAN_COLUMNS, 0.0)
+        self.sum_squares = dict.fromkeys(MEAN_COLUMNS, 0.0)
+
+    def update(self, frame):
+        self.runs += len(frame)
+        for label, wins in frame['winning_agent'].dropna().str[0].value_counts().items():
+            self.wins[label] += int(wins)
+        for column in MEAN_COLUMNS:
+            values = frame[column].dropna().to_numpy()
+            self.count[column] += len(values)
+            self.sum[column] += values.sum()
+            self.sum_squares[column] += (values ** 2).sum()
+
+    def win_ratio(self, label):
+        return self.wins[label] / self.runs if self.runs else np.nan
+
+    def mean(self, column):
+        return self.sum[column] / self.count[column] if self.count[column] else np.nan
+
+    def win_ratio_half_width(self, label, z=1.96):
+        # Agresti-Coull interval, which stays honest for strategies that have (almost) never won
+        runs = self.runs + z ** 2
+        ratio = (self.wins[label] + z ** 2 / 2) / runs
+        return z * np.sqrt(ratio * (1 - ratio) / runs)
+
+    def mean_half_width(self, column, z=1.96):
+        count = self.count[column]
+        if count < 2:
+            return np.inf
+        variance = max(self.sum_squares[column] - self.sum[column] ** 2 / count, 0.0) / (count - 1)
+        return z * np.sqrt(variance / count)
+
+    def converged(self, targets=DEFAULT_TARGETS, z=1.96):
+        if any(self.win_ratio_half_width(label, z) > targets['win_ratio'] for label in STRATEGY_LABELS):
+            return False
+        return all(self.mean_half_width(column, z) <= targets[column] for column in MEAN_COLUMNS)
+
+    def summary(self, z=1.96):
+        row = {'runs': self.runs}
+        for label in STRATEGY_LABELS:
+            row[f'win_ratio_{label}'] = self.win_ratio(label)
+            row[f'win_ratio_{label}_half_width'] = self.win_ratio_half_width(label, z)
+        for column in MEAN_COLUMNS:
+            row[f'mean_{column}'] = self.mean(column)
+            row[f'mean_{column}_half_width'] = self.mean_half_width(column, z)
+        return row
+
+
+def load_or_run_chunk(directory, key, chunk, point, chunk_size, manual_values=None):
+    path = chunk_path(directory, key, chunk)
+    if os.path.exists(path):
+        return read_results(path)
+    # Child chunk of the point's SeedSequence, the same seed spawn() would give it
+    seed_sequence = np.random.SeedSequence(int(key, 16), spawn_key=(chunk,))
+    return run_point_chunk(point, chunk_size, seed_sequence, manual_values)
+
+
+def run_adaptive_sweep(directory, points, seed=0, targets=DEFAULT_TARGETS, z=1.96, chunk_size=250, min_runs=500,
+                       max_runs=50000, workers=None, manual_values=None):
+    # Simulate every point until its confidence intervals reach the targets (after at least min_runs auctions) or
+    # max_runs is hit, and return one summary row per point. Chunks are cached in directory like in run_sweep.
+    os.makedirs(directory, exist_ok=True)
+    keys = [point_key(point, 'adaptive', seed, chunk_size, manual_values) for point in points]
+    stats = [OutcomeStats() for _ in points]
+    next_chunk = [0] * len(points)
+    converged = [False] * len(points)
+    if workers is None:
+        workers = os.cpu_count()
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        active = list(range(len(points)))
+        while active:
+            # Spread a round of chunks over the points that are still uncertain, at least one each
+            per_point = max(1, workers // len(active))
+            tasks = [(index, next_chunk[index] + offset) for index in active for offset in range(per_point)
+                     if (next_chunk[index] + offset) * chunk_size < max_runs]
+            arguments = [(directory, keys[index], chunk, points[index], chunk_size, manual_values)
+                         for index, chunk in tasks]
+            if pool is None:
+                frames = [load_or_run_chunk(*argument) for argument in arguments]
+            else:
+                frames = list(pool.map(load_or_run_chunk, *zip(*arguments)))
+
+            for (index, chunk), frame in zip(tasks, frames):
+                if not os.path.exists(chunk_path(directory, keys[index], chunk)):
+                    save_chunk(directory, keys[index], chunk, frame)
+                stats[index].update(frame)
+                next_chunk[index] = chunk + 1
+            for index in active:
+                converged[index] = stats[index].runs >= min_runs and stats[index].converged(targets, z)
+            active = [index for index in active if not converged[index] and next_chunk[index] * chunk_size < max_runs]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return pd.DataFrame([dict(point, converged=done, **stat.summary(z))
+                         for point, done, stat in zip(points, converged, stats)])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep until the outcome estimates of every point converge")
+    add_space_arguments(parser)
+    parser.add_argument('--win-ratio-precision', type=float, default=DEFAULT_TARGETS['win_ratio'])
+    parser.add_argument('--profit-precision', type=float, default=DEFAULT_TARGETS['Profit'])
+    parser.add_argument('--efficiency-precision', type=float, default=DEFAULT_TARGETS['efficiency'])
+    parser.add_argument('--min-runs', type=int, default=500)
+    parser.add_argument('--max-runs', type=int, default=50000)
+    parser.add_argument('--output', default='adaptive_summary.parquet')
+    args = parser.parse_args()
+
+    targets = {'win_ratio': args.win_ratio_precision, 'Profit': args.profit_precision,
+               'efficiency': args.efficiency_precision}
+    summary = run_adaptive_sweep(args.directory, points_from_arguments(args), seed=args.seed, targets=targets,
+                                 chunk_size=args.chunk_size, min_runs=args.min_runs, max_runs=args.max_runs,
+                                 workers=args.workers)
+    write_results(summary, args.output, columns=summary.columns)
+    print(summary.to_string())
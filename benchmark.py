@@ -0,0 +1,190 @@
+# Description: Benchmark suite for the auction simulators. Runs main.Auction and main_final.Auction (and the array
+# engine of vector_engine.py) over a grid of agent counts, tick resolutions and data-collection levels, and reports
+# ticks/sec, auctions/sec and the peak memory of one auction as JSON. Passing a stored baseline compares every
+# configuration against it and exits with an error when throughput or memory regressed beyond the tolerance, so a
+# change to Player.step or the signal sampling can be checked before launching a large sweep. benchmark_baseline.json
+# holds the results of the default grid (environment recorded inside); compare against it on the same kind of machine,
+# e.g. python benchmark.py --baseline benchmark_baseline.json.
+#
+# The array engine runs its strategy kernels only at the ticks where a bid can change (a signal arrival, a reveal
+# time or a new top bid on the relay) and otherwise only moves the bid queues and picks the relay's winner, so at 9
+# agents and 10 ms ticks it is faster than main_final with collection='none' (about 79k against 44k ticks/sec in the
+# baseline) and ahead of main at every agent count. At 10 ms ticks the event-driven run is slower than stepping every
+# tick, since half of the ticks are events anyway; it pays off from 1 ms ticks on. Campaigns of many small auctions
+# are fastest batched across auctions with simulate_batch.
+
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import warnings
+import numpy as np
+
+ENGINES = ['main', 'main_final', 'vector', 'vector_events']
+
+# Parameters of the auctions in runscript.py
+AUCTION_PARAMETERS = {'rate_public_mean': 0.08183, 'rate_public_sd': 0.0371, 'rate_private_mean': 0.04404,
+                      'rate_private_sd': 0.0241, 'T_mean': 12, 'T_sd': 0, 'delay': 10}
+
+STRATEGY_NAMES = ['Naive', 'Adaptive', 'LastMinute', 'Stealth', 'Bluff']
+
+# Fields identifying a configuration when comparing against a baseline
+CONFIG_FIELDS = ['engine', 'agents', 'ticks_per_second', 'collection']
+
+
+def strategy_mix(n_agents):
+    # Spread the agents evenly over N, A, L, S, B
+    counts = [n_agents // 5] * 5
+    for index in range(n_agents % 5):
+        counts[index] += 1
+    return counts
+
+
+def make_auction(engine, n_agents, ticks_per_second, collection):
+    # Build one auction and return it with the number of ticks it runs for and a function running it to the end
+    mix = strategy_mix(n_agents)
+    if engine in ('main', 'main_final'):
+        module = __import__(engine)
+        model = module.Auction(*mix, **AUCTION_PARAMETERS, collection=collection)
+        n_ticks = int(model.T * 100)
+
+        def run():
+            for _ in range(n_ticks):
+                model.step()
+        return model, n_ticks, run
+
+    # The array engine builds the same strategy mix from a config, its seat layout stops at nine agents
+    from vector_engine import VectorAuction
+    config = [{'strategy': name, 'count': count} for name, count in zip(STRATEGY_NAMES, mix) if count]
+    model = VectorAuction(0, 0, 0, 0, 0, **AUCTION_PARAMETERS, ticks_per_second=ticks_per_second, agents=config)
+    return model, model.n_ticks, lambda: model.run(event_driven=engine == 'vector_events')
+
+
+def agent_count(engine, model):
+    if engine in ('main', 'main_final'):
+        return len(model.schedule.agents)
+    return len(model.code)
+
+
+def applies(engine, n_agents, ticks_per_second, collection):
+    # The Mesa models run at 10 ms ticks and collect data, the array engine has a resolution but no collection.
+    # main_final.py only defines nine seats
+    if engine in ('main', 'main_final'):
+        return ticks_per_second == 100 and (engine == 'main' or n_agents <= 9)
+    return collection == 'none'
+
+
+def measure(engine, n_agents, ticks_per_second, collection, auctions, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    total_ticks = 0
+    elapsed = 0.0
+    for _ in range(auctions):
+        model, n_ticks, run = make_auction(engine, n_agents, ticks_per_second, collection)
+        start = time.perf_counter()
+        run()
+        elapsed += time.perf_counter() - start
+        total_ticks += n_ticks
+
+    # Peak memory of building and running one more auction, measured apart since tracing slows the run down
+    tracemalloc.start()
+    model, _, run = make_auction(engine, n_agents, ticks_per_second, collection)
+    run()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'engine': engine, 'agents': agent_count(engine, model), 'ticks_per_second': ticks_per_second,
+            'collection': collection, 'auctions': auctions, 'ticks': total_ticks, 'seconds': elapsed,
+            'ticks_per_sec': total_ticks / elapsed if elapsed else float('inf'),
+            'auctions_per_sec': auctions / elapsed if elapsed else float('inf'),
+            'peak_memory_bytes': peak_memory}
+
+
+def run_benchmarks(engines=ENGINES, agent_counts=(9, 100, 1000), resolutions=(100, 1000),
+                   collections=('none', 'final', 'full'), auctions=3, seed=0):
+    records = []
+    for engine, n_agents, ticks_per_second, collection in itertools.product(engines, agent_counts, resolutions,
+                                                                            collections):
+        if not applies(engine, n_agents, ticks_per_second, collection):
+            continue
+        record = measure(engine, n_agents, ticks_per_second, collection, auctions, seed)
+        print(f"{engine:>13} agents={record['agents']:<5} ticks/s={ticks_per_second:<5} collection={collection:<7} "
+              f"{record['ticks_per_sec']:>10.0f} ticks/sec {record['auctions_per_sec']:>8.2f} auctions/sec "
+              f"{record['peak_memory_bytes'] / 2 ** 20:>8.2f} MiB")
+        records.append(record)
+    return records
+
+
+def environment():
+    import mesa
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'mesa': mesa.__version__,
+            'machine': platform.machine(), 'processor': platform.processor()}
+
+
+def config_key(record):
+    return tuple(record[field] for field in CONFIG_FIELDS)
+
+
+def compare(records, baseline, tolerance=0.2):
+    # Compare every configuration present in both runs. Returns the rows of the comparison and whether any
+    # throughput dropped or peak memory grew by more than the tolerance
+    previous = {config_key(record): record for record in baseline['results']}
+    rows = []
+    regressed = False
+    for record in records:
+        old = previous.get(config_key(record))
+        if old is None:
+            continue
+        speed = record['ticks_per_sec'] / old['ticks_per_sec']
+        memory = record['peak_memory_bytes'] / max(old['peak_memory_bytes'], 1)
+        slower = speed < 1 - tolerance
+        larger = memory > 1 + tolerance
+        regressed |= slower or larger
+        rows.append(dict(zip(CONFIG_FIELDS, config_key(record)), speed_ratio=speed, memory_ratio=memory,
+                         regression=slower or larger))
+    return rows, regressed
+
+
+def parse_list(text, kind=int):
+    return [kind(value) for value in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the auction simulators")
+    parser.add_argument('--engines', type=lambda text: parse_list(text, str), default=ENGINES)
+    parser.add_argument('--agents', type=parse_list, default=[9, 100, 1000])
+    parser.add_argument('--ticks-per-second', type=parse_list, default=[100, 1000])
+    parser.add_argument('--collection', type=lambda text: parse_list(text, str), default=['none', 'final', 'full'])
+    parser.add_argument('--auctions', type=int, default=3, help="timed auctions per configuration")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative slowdown or memory growth")
+    args = parser.parse_args()
+
+    for engine in args.engines:
+        if engine not in ENGINES:
+            parser.error(f"unknown engine {engine}, choose from {ENGINES}")
+    # scipy warns about the norm.rvs(scale=0) draw of T with T_sd=0, Mesa about models not calling Model.__init__
+    warnings.filterwarnings('ignore', category=RuntimeWarning)
+    warnings.filterwarnings('ignore', category=FutureWarning)
+    records = run_benchmarks(args.engines, args.agents, args.ticks_per_second, args.collection, args.auctions,
+                             args.seed)
+    with open(args.output, 'w') as file:
+        json.dump({'environment': environment(), 'results': records}, file, indent=2)
+    print(f'Benchmark results saved to {args.output}')
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            rows, regressed = compare(records, json.load(file), args.tolerance)
+        for row in rows:
+            flag = 'REGRESSION' if row['regression'] else 'ok'
+            print(f"{row['engine']:>13} agents={row['agents']:<5} ticks/s={row['ticks_per_second']:<5} "
+                  f"collection={row['collection']:<7} speed x{row['speed_ratio']:.2f} "
+                  f"memory x{row['memory_ratio']:.2f} {flag}")
+        if regressed:
+            sys.exit(1)
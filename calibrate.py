@@ -0,0 +1,160 @@
+# Description: Simulation-based calibration of the signal rates and lognormal value constants. Candidate parameter
+# sets are simulated in large batches (vector_engine.simulate_batch on common random numbers, so nearby candidates
+# see the same auctions) and scored by how far the quantiles of the simulated winning bid value and winning bid
+# timing are from those observed in winning_bids_labeled.csv. The search samples the space by Latin hypercube and
+# then narrows it around the best candidates each round. Candidates run in parallel and their simulated statistics
+# are cached on disk, so a recalibration against a new month of relay data only simulates points not seen before.
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from campaign import sample_strategies, write_atomic
+from common_random import CommonRandomNumbers
+from results import write_results
+from signals import MAIN_FINAL_SIGNALS
+from sweep import latin_hypercube_points
+from vector_engine import simulate_batch
+
+# Ranges searched by default: the rate means of runscript.py and the lognormal constants of main_final.py
+CALIBRATION_SPACE = {
+    'rate_public_mean': (0.02, 0.2),
+    'rate_private_mean': (0.01, 0.12),
+    'public_mean': (-11.0, -8.5),
+    'public_sigma': (0.4, 1.3),
+    'private_mean': (-10.0, -7.0),
+    'private_sigma': (0.4, 1.3),
+}
+RATE_PARAMETERS = ['rate_public_mean', 'rate_public_sd', 'rate_private_mean', 'rate_private_sd']
+SIGNAL_PARAMETERS = ['public_mean', 'public_sigma', 'private_mean', 'private_sigma']
+
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+MS_PER_TICK = 10
+
+
+def observed_statistics(path='winning_bids_labeled.csv', quantiles=QUANTILES, chunk_size=1000000):
+    # Quantiles of the winning bid value (ETH, the CSV holds wei) and of its arrival time in the slot (slot_t_ms)
+    values, times = [], []
+    for chunk in pd.read_csv(path, usecols=['value', 'slot_t_ms'], chunksize=chunk_size):
+        chunk = chunk.apply(pd.to_numeric, errors='coerce').dropna()
+        values.append(chunk['value'].to_numpy() / 1e18)
+        times.append(chunk['slot_t_ms'].to_numpy())
+    return statistics(np.concatenate(values), np.concatenate(times), quantiles)
+
+
+def simulated_statistics(frame, quantiles=QUANTILES):
+    # Times are compared in the frame of slot_t_ms, milliseconds from the start of the slot: the simulated auction
+    # ends when the slot starts and the proposer takes the winning bid, so its ticks count up to 0 from -T
+    frame = frame.dropna(subset=['winning_bid_value'])
+    slot_ticks = frame['winning_bid_tick'].to_numpy() - (frame['auction_time'].to_numpy() + 1)
+    return statistics(frame['winning_bid_value'].to_numpy(), slot_ticks * MS_PER_TICK, quantiles)
+
+
+def statistics(values, times_ms, quantiles):
+    return {'value_quantiles': np.quantile(values, quantiles).tolist(),
+            'time_quantiles_ms': np.quantile(times_ms, quantiles).tolist()}
+
+
+def distance(simulated, observed, timing_weight=1.0):
+    # Squared log ratio of the value quantiles plus the squared gap of the timing quantiles in seconds
+    simulated_values = np.maximum(simulated['value_quantiles'], 1e-12)
+    observed_values = np.maximum(observed['value_quantiles'], 1e-12)
+    value_error = np.sum(np.log(simulated_values / observed_values) ** 2)
+    time_error = np.sum(((np.array(simulated['time_quantiles_ms']) - observed['time_quantiles_ms']) / 1000) ** 2)
+    return float(value_error + timing_weight * time_error)
+
+
+def candidate_key(point, n_auctions, seed):
+    # Candidates cached before times were measured from the slot start are not reused
+    description = json.dumps({'point': point, 'runs': n_auctions, 'seed': seed, 'time_frame': 'slot'},
+                             sort_keys=True)
+    return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+
+def simulate_candidate(point, n_auctions, seed, quantiles=QUANTILES):
+    # Simulated statistics of one parameter set. Strategy mixes, agents and auctions come from the seed alone, so
+    # every candidate is scored on the same auctions
+    rng = np.random.default_rng(seed)
+    strategies = sample_strategies(n_auctions, rng)
+    signal_params = dict(MAIN_FINAL_SIGNALS, **{name: point[name] for name in SIGNAL_PARAMETERS if name in point})
+    rates = {name: point[name] for name in RATE_PARAMETERS if name in point}
+    frame = simulate_batch(strategies, n_auctions, rng=rng, common=CommonRandomNumbers(seed),
+                           signal_params=signal_params, bid_timing=True, **rates)
+    return simulated_statistics(frame, quantiles)
+
+
+def load_or_simulate(directory, point, n_auctions, seed):
+    path = os.path.join(directory, f'candidate-{candidate_key(point, n_auctions, seed)}.json')
+    if os.path.exists(path):
+        with open(path) as file:
+            return json.load(file)['statistics']
+    result = simulate_candidate(point, n_auctions, seed)
+
+    def write(temporary):
+        with open(temporary, 'w') as file:
+            json.dump({'point': point, 'runs': n_auctions, 'seed': seed, 'statistics': result}, file)
+    write_atomic(path, write)
+    return result
+
+
+def narrow_space(space, bounds, best_points, margin=0.1):
+    # Bounding box of the best points, widened by margin of the original range and kept inside it
+    narrowed = {}
+    for name, (low, high) in space.items():
+        values = [point[name] for point in best_points]
+        pad = margin * (bounds[name][1] - bounds[name][0])
+        narrowed[name] = (max(min(values) - pad, bounds[name][0]), min(max(values) + pad, bounds[name][1]))
+    return narrowed
+
+
+def calibrate(observed, directory, space=CALIBRATION_SPACE, rounds=4, points_per_round=32, n_auctions=2000, seed=0,
+              workers=None, elite=4, timing_weight=1.0):
+    # Return every evaluated candidate with its distance to the observed statistics, best first
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    if workers is None:
+        workers = os.cpu_count()
+    bounds = dict(space)
+    rows = []
+    for round_index in range(rounds):
+        points = latin_hypercube_points(space, points_per_round, rng)
+        arguments = [(directory, point, n_auctions, seed) for point in points]
+        if workers == 1:
+            results = [load_or_simulate(*argument) for argument in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(points))) as pool:
+                results = list(pool.map(load_or_simulate, *zip(*arguments)))
+        for point, simulated in zip(points, results):
+            rows.append(dict(point, round=round_index, distance=distance(simulated, observed, timing_weight),
+                             **{f'value_q{q:g}': v for q, v in zip(QUANTILES, simulated['value_quantiles'])},
+                             **{f'time_q{q:g}_ms': v for q, v in zip(QUANTILES, simulated['time_quantiles_ms'])}))
+        best = sorted(rows, key=lambda row: row['distance'])[:elite]
+        print(f"round {round_index}: best distance {best[0]['distance']:.4f}")
+        space = narrow_space(space, bounds, best)
+    return pd.DataFrame(rows).sort_values('distance', ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Calibrate signal rates and value distributions to relay data")
+    parser.add_argument('observed', nargs='?', default='winning_bids_labeled.csv')
+    parser.add_argument('--dir', default='calibration_cache', help="cache of simulated candidates")
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--points', type=int, default=32, help="candidates per round")
+    parser.add_argument('--runs', type=int, default=2000, help="auctions per candidate")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--timing-weight', type=float, default=1.0)
+    parser.add_argument('--output', default='calibration_results.parquet')
+    args = parser.parse_args()
+
+    observed = observed_statistics(args.observed)
+    print(f"Observed: {observed}")
+    results = calibrate(observed, args.dir, rounds=args.rounds, points_per_round=args.points, n_auctions=args.runs,
+                        seed=args.seed, workers=args.workers, timing_weight=args.timing_weight)
+    write_results(results, args.output, columns=results.columns)
+    best = results.iloc[0]
+    print('Best parameters: ' + ', '.join(f'{name}={best[name]:.6g}' for name in CALIBRATION_SPACE))
+    print(f'Calibration results saved to {args.output}')
@@ -0,0 +1,230 @@
+# Description: Runs a Monte Carlo campaign of auctions across a process pool and merges the results, replacing the
+# manual "python runscript.py <index>" shards that compile.py used to glue together. Auctions are split into fixed-size
+# chunks and every chunk gets its own child of one SeedSequence, so a campaign is reproducible from its seed no matter
+# how many workers run it. Campaigns run in a directory checkpoint every chunk and resume where they stopped. The
+# running aggregates of running_stats.py are updated with every finished chunk and saved next to the results.
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from results import ResultWriter, read_results, write_results
+from running_stats import RunningAggregates, aggregates_path, results_fingerprint
+from vector_engine import RESULT_COLUMNS, simulate_batch
+
+STRATEGY_LABELS = ['N', 'A', 'L', 'S', 'B']
+
+
+def sample_strategies(n_auctions, rng, manual_values=None, n_players=9):
+    # Same as generate_strategies in runscript.py: every player picks a strategy at random and the mix is the count
+    # of each label, drawn for many auctions at once
+    if manual_values:
+        return [dict(manual_values)] * n_auctions
+    assigned = rng.integers(0, len(STRATEGY_LABELS), (n_auctions, n_players))
+    counts = np.stack([(assigned == label).sum(axis=1) for label in range(len(STRATEGY_LABELS))], axis=1)
+    return [dict(zip(STRATEGY_LABELS, map(int, row))) for row in counts]
+
+
+def run_chunk(n_auctions, seed_sequence, delay=10, manual_values=None, agent_params=None, common=None,
+              first_auction=0):
+    rng = np.random.default_rng(seed_sequence)
+    strategies = sample_strategies(n_auctions, rng, manual_values)
+    return simulate_batch(strategies, n_auctions, delay=delay, rng=rng, common=common, first_auction=first_auction,
+                          **(agent_params or {}))
+
+
+def chunk_sizes(num_runs, chunk_size):
+    return [min(chunk_size, num_runs - start) for start in range(0, num_runs, chunk_size)]
+
+
+# Default chunking: at least DEFAULT_CHUNKS chunks, so small campaigns still spread over a pool, and at most
+# MAX_CHUNK_SIZE auctions per chunk, so large ones checkpoint often and stay small in memory
+DEFAULT_CHUNKS = 64
+MAX_CHUNK_SIZE = 250
+
+
+def default_chunk_size(num_runs):
+    # Depends on num_runs only, so the seed alone fixes the rows whatever the number of workers
+    return max(1, min(MAX_CHUNK_SIZE, -(-num_runs // DEFAULT_CHUNKS)))
+
+
+def iter_campaign(num_runs, seed=None, workers=None, chunk_size=None, delay=10, manual_values=None):
+    # Yield the result frame of every chunk in chunk order. Results depend on seed and chunk_size only; workers just
+    # decides how many chunks run at the same time
+    if workers is None:
+        workers = os.cpu_count()
+    if chunk_size is None:
+        chunk_size = default_chunk_size(num_runs)
+    seed_sequence = np.random.SeedSequence(seed)
+    sizes = chunk_sizes(num_runs, chunk_size)
+    children = seed_sequence.spawn(len(sizes))
+
+    if workers == 1 or len(sizes) <= 1:
+        for size, child in zip(sizes, children):
+            yield run_chunk(size, child, delay, manual_values)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes))) as pool:
+            yield from pool.map(run_chunk, sizes, children, [delay] * len(sizes), [manual_values] * len(sizes))
+
+
+def run_campaign(num_runs, seed=None, workers=None, chunk_size=None, delay=10, manual_values=None, aggregates=None):
+    # aggregates, a running_stats.RunningAggregates, is updated with every chunk as it arrives
+    frames = []
+    for frame in iter_campaign(num_runs, seed, workers, chunk_size, delay, manual_values):
+        if aggregates is not None:
+            aggregates.update(frame)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_campaign(path, num_runs, seed=None, workers=None, chunk_size=None, delay=10, manual_values=None):
+    # Run a campaign into the results file path, yielding the running aggregates after every chunk. They are saved
+    # next to path after every chunk, for running_stats.load_aggregates while the file is still being written, and
+    # once more with the fingerprint of the file when it is complete
+    aggregates = RunningAggregates()
+    with ResultWriter(path) as writer:
+        for frame in iter_campaign(num_runs, seed, workers, chunk_size, delay, manual_values):
+            writer.extend(frame)
+            write_atomic(aggregates_path(path), aggregates.update(frame).save)
+            yield aggregates
+    write_atomic(aggregates_path(path), lambda sidecar: aggregates.save(sidecar, results_fingerprint(path)))
+
+
+def write_atomic(path, write):
+    # Write to a temporary file next to path and move it into place, so a crash never leaves a half-written file
+    temporary = path + '.tmp'
+    write(temporary)
+    os.replace(temporary, path)
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_manifest(directory, manifest):
+    def write(path):
+        with open(path, 'w') as file:
+            json.dump(manifest, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+    write_atomic(os.path.join(directory, 'manifest.json'), write)
+
+
+def part_path(directory, chunk):
+    return os.path.join(directory, f'part-{chunk:06d}.parquet')
+
+
+def stats_path(directory, chunk):
+    return os.path.join(directory, f'stats-{chunk:06d}.parquet')
+
+
+def chunk_aggregates(directory, chunk):
+    # Aggregates of a finished chunk, computed from its part when it was checkpointed before they were kept
+    if os.path.exists(stats_path(directory, chunk)):
+        return RunningAggregates.load(stats_path(directory, chunk))
+    return RunningAggregates().update(read_results(part_path(directory, chunk)))
+
+
+def campaign_aggregates(directory):
+    # Aggregates of every chunk a campaign directory has finished, e.g. from another process while it runs
+    manifest = load_manifest(directory)
+    aggregates = RunningAggregates()
+    for chunk in manifest['completed_chunks'] if manifest else []:
+        aggregates.merge(chunk_aggregates(directory, chunk))
+    return aggregates
+
+
+def run_resumable_campaign(directory, num_runs, seed=None, workers=None, chunk_size=None, delay=10,
+                           manual_values=None):
+    # Run a campaign whose state lives in directory: manifest.json records the parameters, the seed and the chunks
+    # already done, and every chunk of chunk_size auctions is checkpointed as its own Parquet part. Calling this again
+    # with the same directory skips the finished chunks; since each chunk has its own seed the rerun chunks give the
+    # same rows they would have given the first time. Every chunk also saves its aggregates as stats-*.parquet, and
+    # aggregates.parquet holds those of all finished chunks after each checkpoint. Without a chunk_size a new campaign
+    # takes default_chunk_size and a resumed one keeps the chunk_size it was started with.
+    os.makedirs(directory, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count()
+    manifest = load_manifest(directory)
+    if chunk_size is None:
+        chunk_size = manifest['chunk_size'] if manifest else default_chunk_size(num_runs)
+    parameters = {'num_runs': num_runs, 'chunk_size': chunk_size, 'delay': delay, 'manual_values': manual_values}
+    if manifest is None:
+        manifest = dict(parameters, seed=seed if seed is not None else np.random.SeedSequence().entropy,
+                        completed_chunks=[])
+        save_manifest(directory, manifest)
+    else:
+        if seed is not None and seed != manifest['seed']:
+            raise ValueError(f"{directory} holds a campaign with seed {manifest['seed']}, not {seed}")
+        for name, value in parameters.items():
+            if manifest[name] != value:
+                raise ValueError(f"{directory} holds a campaign with {name}={manifest[name]}, not {value}")
+
+    sizes = chunk_sizes(num_runs, chunk_size)
+    children = np.random.SeedSequence(manifest['seed']).spawn(len(sizes))
+    completed = set(manifest['completed_chunks'])
+    pending = [chunk for chunk in range(len(sizes)) if chunk not in completed]
+    aggregates = campaign_aggregates(directory)
+
+    def checkpoint(chunk, frame):
+        write_atomic(part_path(directory, chunk), lambda path: write_results(frame, path))
+        chunk_stats = RunningAggregates().update(frame)
+        write_atomic(stats_path(directory, chunk), chunk_stats.save)
+        completed.add(chunk)
+        manifest['completed_chunks'] = sorted(completed)
+        save_manifest(directory, manifest)
+        write_atomic(os.path.join(directory, 'aggregates.parquet'), aggregates.merge(chunk_stats).save)
+
+    if workers == 1 or len(pending) <= 1:
+        for chunk in pending:
+            checkpoint(chunk, run_chunk(sizes[chunk], children[chunk], delay, manual_values))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            futures = {pool.submit(run_chunk, sizes[chunk], children[chunk], delay, manual_values): chunk
+                       for chunk in pending}
+            for future in as_completed(futures):
+                checkpoint(futures[future], future.result())
+
+    if not sizes:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return read_results(os.path.join(directory, 'part-*.parquet'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a simulation campaign across a process pool")
+    parser.add_argument('num_runs', type=int)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="auctions per chunk, by default num_runs / 64 up to 250")
+    parser.add_argument('--delay', type=int, default=10)
+    parser.add_argument('--output', default='combined_test_files.parquet')
+    parser.add_argument('--dir', default=None, help="checkpoint the campaign in this directory and resume from it")
+    args = parser.parse_args()
+
+    if args.dir is not None:
+        results = run_resumable_campaign(args.dir, args.num_runs, seed=args.seed, workers=args.workers,
+                                         chunk_size=args.chunk_size, delay=args.delay)
+        manifest = load_manifest(args.dir)
+        print(f"Campaign seed: {manifest['seed']}, chunk size: {manifest['chunk_size']}")
+        write_results(results, args.output)
+        campaign_aggregates(args.dir).save(aggregates_path(args.output), results_fingerprint(args.output))
+        rows_written = len(results)
+    else:
+        # Pick and print the seed up front so an unseeded campaign can still be reproduced
+        seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+        chunk_size = args.chunk_size or default_chunk_size(args.num_runs)
+        print(f'Campaign seed: {seed}, chunk size: {chunk_size}')
+        rows_written = 0
+        for aggregates in write_campaign(args.output, args.num_runs, seed=seed, workers=args.workers,
+                                         chunk_size=chunk_size, delay=args.delay):
+            rows_written = aggregates.runs()
+    print(f'Simulation results of {rows_written} runs saved to {args.output}')
@@ -0,0 +1,82 @@
+# Description: Lightweight data collection for the auction models. Mesa's DataCollector stores every model reporter
+# and one row per agent on every tick, which production runs never read. TickRecorder keeps the same signal totals,
+# the winning bid of the tick and every agent's bid in preallocated NumPy buffers, either for the final tick only or
+# for every Nth tick, and builds DataFrames shaped like the DataCollector ones on request.
+
+import numpy as np
+import pandas as pd
+
+# none: nothing is stored, final: only the last tick, sampled: every collect_every ticks, full: Mesa DataCollector
+COLLECTION_LEVELS = ['none', 'final', 'sampled', 'full']
+
+# Model reporters kept by TickRecorder, named like the attributes of the Auction models
+RECORDED_SIGNALS = ['public_signal', 'public_signal_value', 'private_signal_max', 'aggregated_signal_max']
+
+
+class TickRecorder:
+    def __init__(self, n_ticks, n_agents, level='final', collect_every=100):
+        if level not in ('final', 'sampled'):
+            raise ValueError(f"TickRecorder keeps final or sampled data, not {level}")
+        if collect_every < 1:
+            raise ValueError("collect_every must be at least 1")
+        self.n_ticks = n_ticks
+        self.level = level
+        self.collect_every = collect_every
+        rows = 1 if level == 'final' else max(-(-n_ticks // collect_every), 1)
+        self.ticks = np.zeros(rows, dtype=np.int64)
+        self.signals = {name: np.zeros(rows) for name in RECORDED_SIGNALS}
+        self.winning_bids = np.full(rows, np.nan)
+        self.bids = np.zeros((rows, n_agents))
+        self.probabilities = None
+        self.agent_ids = None
+        self.size = 0
+
+    def wants(self, tick):
+        if self.level == 'final':
+            return tick >= self.n_ticks - 1
+        return tick % self.collect_every == 0
+
+    def record(self, model, tick, has_winner):
+        # Store the state at the end of this tick, has_winner tells whether any bid was released at it
+        if not self.wants(tick):
+            return
+        if self.level == 'final':
+            row = 0
+        else:
+            row = self.size
+            if row == len(self.ticks):
+                # The model ran past the ticks of its auction time
+                self.grow()
+        if self.agent_ids is None:
+            self.agent_ids = [agent.unique_id for agent in model.schedule.agents]
+            self.probabilities = np.array([agent.probability for agent in model.schedule.agents])
+        self.ticks[row] = tick
+        for name, values in self.signals.items():
+            values[row] = getattr(model, name)
+        self.winning_bids[row] = model.winning_bid if has_winner else np.nan
+        self.bids[row] = [agent.bid for agent in model.schedule.agents]
+        self.size = row + 1
+
+    def grow(self):
+        rows = len(self.ticks)
+        self.ticks = np.concatenate((self.ticks, np.zeros(rows, dtype=np.int64)))
+        self.signals = {name: np.concatenate((values, np.zeros(rows))) for name, values in self.signals.items()}
+        self.winning_bids = np.concatenate((self.winning_bids, np.full(rows, np.nan)))
+        self.bids = np.concatenate((self.bids, np.zeros_like(self.bids)))
+
+    def get_model_vars_dataframe(self):
+        frame = pd.DataFrame({name: values[:self.size] for name, values in self.signals.items()},
+                             index=pd.Index(self.ticks[:self.size], name='Step'))
+        frame['winning_bid'] = self.winning_bids[:self.size]
+        return frame.rename(columns={'public_signal': 'Public Signal Number', 'public_signal_value': 'Public Signal',
+                                     'private_signal_max': 'Private Signal Max',
+                                     'aggregated_signal_max': 'Aggregated Signal Max',
+                                     'winning_bid': 'Winning Bid'})
+
+    def get_agent_vars_dataframe(self):
+        # One row per recorded tick and agent, indexed by (Step, AgentID) like DataCollector
+        agent_ids = self.agent_ids or []
+        index = pd.MultiIndex.from_product([self.ticks[:self.size], agent_ids], names=['Step', 'AgentID'])
+        return pd.DataFrame({'Bid': self.bids[:self.size].ravel(),
+                             'Probability': np.tile(self.probabilities, self.size) if self.size else []},
+                            index=index)
@@ -0,0 +1,102 @@
+# Description: Common random numbers for comparing strategy configurations. Every auction index gets its own random
+# stream, a child of one SeedSequence, from which its duration, signal rates, public/private signal paths and private
+# signal delivery coin flips are drawn. Configurations run with the same CommonRandomNumbers therefore see identical
+# auctions and differ only in their agents, and paired_difference estimates their difference auction by auction.
+
+import numpy as np
+from signals import MAIN_FINAL_SIGNALS, SignalStream, signal_batch
+from vector_engine import positive_normal
+
+
+class CommonRandomNumbers:
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def auction_rng(self, index):
+        # Spawn key (0, index): keys starting with 1 hold the chunk seeds of sweeps that share this seed
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(0, int(index))))
+
+    def draw_auction(self, index, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd, T_mean, T_sd,
+                     params=MAIN_FINAL_SIGNALS, ticks_per_second=100):
+        # Duration, rates and signals of one auction. Also returns its stream, positioned at the delivery coin flips
+        rng = self.auction_rng(index)
+        T = T_mean + T_sd * rng.standard_normal()
+        n_ticks = max(int(T * ticks_per_second), 0)
+        tick_scale = ticks_per_second / 100
+        public_lambda = positive_normal(rng, rate_public_mean, rate_public_sd, 1)[0]
+        private_lambda = positive_normal(rng, rate_private_mean, rate_private_sd, 1)[0]
+        public_counts = rng.poisson(public_lambda / tick_scale, n_ticks)
+        public_values = rng.lognormal(mean=params['public_mean'], sigma=params['public_sigma'],
+                                      size=public_counts.sum())
+        private_counts = rng.poisson(private_lambda / tick_scale, n_ticks)
+        private_values = rng.lognormal(mean=params['private_mean'], sigma=params['private_sigma'],
+                                       size=private_counts.sum())
+        return (T, public_lambda, private_lambda, public_counts, public_values, private_counts, private_values), rng
+
+    def delivery_draws(self, rng, n_signals, n_seats):
+        # Uniforms compared against each seat's probability, drawn seat by seat so seat j gets the same coin flips
+        # whatever the number of seats of the configuration
+        return rng.random((n_seats, n_signals)).T
+
+    def draw(self, auctions, n_seats, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd, T_mean,
+             T_sd, params=MAIN_FINAL_SIGNALS):
+        # Batch of auctions for vector_engine.simulate_chunk: durations, rates, the signal arrays of
+        # signals.signal_batch and one row of delivery uniforms per private signal
+        draws = [self.draw_auction(index, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd,
+                                   T_mean, T_sd, params) for index in auctions]
+        T = np.array([values[0] for values, _ in draws])
+        max_ticks = max((len(values[3]) for values, _ in draws), default=0)
+        public_counts = np.zeros((len(draws), max_ticks), dtype=np.int64)
+        private_counts = np.zeros((len(draws), max_ticks), dtype=np.int64)
+        for row, (values, _) in enumerate(draws):
+            public_counts[row, :len(values[3])] = values[3]
+            private_counts[row, :len(values[5])] = values[5]
+        public_values = np.concatenate([values[4] for values, _ in draws] + [np.zeros(0)])
+        private_values = np.concatenate([values[6] for values, _ in draws] + [np.zeros(0)])
+        delivery = np.concatenate([self.delivery_draws(rng, len(values[6]), n_seats) for values, rng in draws] +
+                                  [np.zeros((0, n_seats))])
+        return {'T': T,
+                'public_lambda': np.array([values[1] for values, _ in draws]),
+                'private_lambda': np.array([values[2] for values, _ in draws]),
+                'signals': signal_batch(public_counts, public_values, private_counts, private_values, params),
+                'delivery': delivery}
+
+    def signal_stream(self, index, rate_public_mean=0.08183, rate_public_sd=0.0371, rate_private_mean=0.04404,
+                      rate_private_sd=0.0241, T_mean=12, T_sd=0, params=MAIN_FINAL_SIGNALS, ticks_per_second=100):
+        # Signals of one auction for the signal_stream argument of the Auction models and VectorAuction. The models
+        # still draw their own duration, so give them T_sd=0 or a stream at least as long as they run
+        values, rng = self.draw_auction(index, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd,
+                                        T_mean, T_sd, params, ticks_per_second)
+        return CommonSignalStream(values[3], values[4], values[5], values[6], params['public_signal'],
+                                  params['public_signal_value'], common=self, rng=rng)
+
+
+class CommonSignalStream(SignalStream):
+    # SignalStream whose delivery coin flips come from the auction's common stream instead of the rng the model passes
+    def __init__(self, *args, common=None, rng=None):
+        super().__init__(*args)
+        self.common = common
+        self.common_rng = rng
+
+    def draw_delivery(self, probability, rng=None):
+        uniforms = self.common.delivery_draws(self.common_rng, len(self.private_values), len(probability))
+        self.delivery = uniforms < np.asarray(probability)
+
+
+def paired_difference(baseline, other, column='Profit', z=1.96):
+    # Mean of other - baseline over auctions run with the same common random numbers, rows matched by position. The
+    # unpaired half-width is what two independent runs of the same size would give
+    a = np.asarray(baseline[column], dtype=np.float64)
+    b = np.asarray(other[column], dtype=np.float64)
+    if len(a) != len(b):
+        raise ValueError(f"paired results need the same auctions, got {len(a)} and {len(b)} rows")
+    keep = ~(np.isnan(a) | np.isnan(b))
+    a, b = a[keep], b[keep]
+    n = len(a)
+    difference = b - a
+    sd = difference.std(ddof=1) if n > 1 else np.nan
+    unpaired_sd = np.sqrt(a.var(ddof=1) + b.var(ddof=1)) if n > 1 else np.nan
+    return {'n': n, 'mean_difference': difference.mean() if n else np.nan,
+            'half_width': z * sd / np.sqrt(n) if n > 1 else np.nan,
+            'unpaired_half_width': z * unpaired_sd / np.sqrt(n) if n > 1 else np.nan,
+            'correlation': np.corrcoef(a, b)[0, 1] if n > 1 else np.nan}
@@ -1,13 +1,27 @@
-import pandas as pd
 import glob
+import os
+import pandas as pd
+from results import read_results, write_results
+from running_stats import RunningAggregates, aggregates_path, results_fingerprint
 
-# Get all files matching the pattern
-csv_files = glob.glob("d?.csv")
-
-# Read and concatenate the last 10000 rows from each file
-combined_df = pd.concat([pd.read_csv(f).head(5000) for f in csv_files], ignore_index=True)
+# Read the first 5000 rows of every shard once: its Parquet file from runscript.py, else the parts of a run that
+# stopped early, else the CSV of older runs
+frames = []
+for shard in sorted({os.path.basename(path).split('.')[0] for path in glob.glob("d?.*")}):
+    if os.path.exists(f"{shard}.parquet"):
+        pattern = f"{shard}.parquet"
+    elif glob.glob(f"{shard}.part*.parquet"):
+        pattern = f"{shard}.part*.parquet"
+    else:
+        pattern = f"{shard}.csv"
+    frames.append(read_results(pattern).head(5000))
+combined_df = pd.concat(frames, ignore_index=True)
 
 # Save to a new file (optional)
-combined_df.to_csv("combined_test_files.csv", index=False)
+write_results(combined_df, "combined_test_files.parquet")
+
+# Aggregates for the analysis scripts, so they do not read the rows again
+RunningAggregates().update(combined_df).save(aggregates_path("combined_test_files.parquet"),
+                                             results_fingerprint("combined_test_files.parquet"))
 
-print(f"Combined last 10000 rows from each of {len(csv_files)} files into 'combined_test_files.csv'")
+print(f"Combined first 5000 rows of each shard into 'combined_test_files.parquet' ({len(combined_df)} rows)")
@@ -0,0 +1,56 @@
+# Description: Shared delay line for the bids of the Mesa auction models. Every Player used to keep its own deque of
+# (bid, aggregated signal) tuples; here all queues live in one circular array (2 x ring size x agents) with the same
+# write slot for every agent and a per-agent read offset, so the bids that mature at a tick leave in a single gather.
+
+import copy
+import numpy as np
+
+
+class BidDelayLine:
+    def __init__(self, queue_lengths):
+        # queue_lengths holds delay + global_delay of every agent: the bid released at tick t is the one pushed at
+        # tick t - queue_length + 1, like a deque with that maxlen that pops once it is full
+        self.queue_lengths = np.asarray(queue_lengths, dtype=np.int64)
+        if len(self.queue_lengths) and self.queue_lengths.min() < 1:
+            raise ValueError("delay + global_delay must be at least 1 for every agent")
+        n_agents = len(self.queue_lengths)
+        self.size = int(self.queue_lengths.max()) if n_agents else 1
+        self.entries = np.zeros((2, self.size * n_agents))
+        # Flat views of the two planes, the entry of agent j at ring slot r is at r * n_agents + j
+        self.bids = self.entries[0]
+        self.signals = self.entries[1]
+        self.agents = np.arange(n_agents)
+        # Flat positions to gather for every write slot: the entry each agent pushed queue_length - 1 ticks earlier
+        slots = (np.arange(self.size)[:, None] - self.queue_lengths + 1) % self.size
+        self.release_positions = slots * n_agents + self.agents
+        self.time = 0
+        self.offset = 0
+
+    def push(self, bids, aggregated_signals):
+        # Queue the bids and aggregated signals every agent computed at the current tick
+        self.bids[self.offset:self.offset + len(self.agents)] = bids
+        self.signals[self.offset:self.offset + len(self.agents)] = aggregated_signals
+
+    def release(self):
+        # Return the agents whose queue is full with the bids and aggregated signals leaving it, in agent order, then
+        # move on to the next tick
+        positions = self.release_positions[self.time % self.size]
+        if self.time + 1 < self.size:
+            matured = self.agents[self.queue_lengths <= self.time + 1]
+            positions = positions[matured]
+        else:
+            matured = self.agents
+        released = self.entries.take(positions, axis=1)
+        self.time += 1
+        self.offset = (self.time % self.size) * len(self.agents)
+        return matured, released[0], released[1]
+
+    def __deepcopy__(self, memo):
+        # bids and signals are views of entries, a plain deepcopy would detach them. The layout arrays never change
+        # and are shared
+        clone = copy.copy(self)
+        clone.entries = self.entries.copy()
+        clone.bids = clone.entries[0]
+        clone.signals = clone.entries[1]
+        memo[id(self)] = clone
+        return clone
@@ -1,15 +1,9 @@
-import pandas as pd
+from running_stats import load_aggregates
 
-# Load the CSV file
-df = pd.read_csv("combined_test_files.csv")
-
-# Ensure 'efficiency' column is numeric
-df['efficiency'] = pd.to_numeric(df['efficiency'], errors='coerce')
-
-# Drop missing or invalid values
-df = df.dropna(subset=['efficiency'])
+# Load the aggregates of the simulation results, non-numeric efficiencies are not counted
+aggregates = load_aggregates("combined_test_files.parquet")
 
 # Calculate average efficiency
-average_efficiency = df['efficiency'].mean()
+average_efficiency = aggregates.mean('efficiency')
 
 print(f"Average efficiency: {average_efficiency:.4f}")
@@ -1,12 +1,14 @@
 import random
-from collections import deque
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from mesa import Agent, Model
 from mesa.time import SimultaneousActivation
 from mesa.datacollection import DataCollector
+from collection import COLLECTION_LEVELS, TickRecorder
+from delay_line import BidDelayLine
 from scipy.stats import poisson, norm
+from signals import MAIN_SIGNALS, sample_signal_stream
 
 # Define the player class
 class Player(Agent):
@@ -16,21 +18,23 @@ class Player(Agent):
         self.delay = delay
         self.probability = probability
         self.bid = 0
-        self.private_signal_value = 0
+        self.index = None  # Row of the agent in the model's private signal array
         self.aggregated_signal = 0
-        self.bid_queue = deque(maxlen=(self.delay + self.model.global_delay))
+
+    @property
+    def private_signal_value(self):
+        return self.model.private_signal_values[self.index]
+
+    @private_signal_value.setter
+    def private_signal_value(self, value):
+        self.model.private_signal_values[self.index] = value
 
     def update_aggregated_signal(self):
         self.aggregated_signal = self.model.public_signal_value + self.private_signal_value
 
     def step(self):
         self.update_aggregated_signal()
-        # Logic for making a bid, specific to each strategy subclass
-
-    def advance(self):
-        if len(self.bid_queue) == self.delay + self.model.global_delay:
-            self.model.current_bids.append(self.bid_queue.popleft())
-            self.model.bid_agents.append(self.unique_id)
+        # Logic for making a bid, specific to each strategy subclass. The model queues self.bid in its delay line
 
 class PlayerWithNaiveStrategy(Player):
     def __init__(self, unique_id, model, pm, delay, probability):
@@ -40,7 +44,6 @@ class PlayerWithNaiveStrategy(Player):
         super().step()
         if self.aggregated_signal > self.pm:
             self.bid = self.aggregated_signal - self.pm
-        self.bid_queue.append((self.bid, self.aggregated_signal))
         
 class PlayerWithAdaptiveStrategy(Player):
     def __init__(self, unique_id, model, pm, delay, probability):
@@ -49,12 +52,12 @@ class PlayerWithAdaptiveStrategy(Player):
     def step(self):
         super().step()
         delta = 0.0001  # Small increment to outbid the highest current bid
-        if self.aggregated_signal > self.pm and len(self.model.max_bids) > 0:
-            if self.aggregated_signal - self.pm > self.model.max_bids[-1] + delta:
-                self.bid = self.model.max_bids[-1] + delta
-            elif self.aggregated_signal - self.pm <= self.model.max_bids[-1] + delta:
+        winning_bid = self.model.winning_bid
+        if self.aggregated_signal > self.pm and winning_bid is not None:
+            if self.aggregated_signal - self.pm > winning_bid + delta:
+                self.bid = winning_bid + delta
+            elif self.aggregated_signal - self.pm <= winning_bid + delta:
                 self.bid = self.aggregated_signal - self.pm
-        self.bid_queue.append((self.bid, self.aggregated_signal))
 
 class PlayerWithLastMinuteStrategy(Player):
     def __init__(self, unique_id, model, pm, delay, probability, time_estimate, time_reveal_epsilon):
@@ -68,7 +71,6 @@ class PlayerWithLastMinuteStrategy(Player):
         if self.model.schedule.time >= time_reveal:
             if self.aggregated_signal > self.pm:
                 self.bid = self.aggregated_signal - self.pm
-        self.bid_queue.append((self.bid, self.aggregated_signal))
 
 class PlayerWithStealthStrategy(Player):
     def __init__(self, unique_id, model, pm, delay, probability, time_estimate, time_reveal_epsilon, stealth_factor):
@@ -84,7 +86,6 @@ class PlayerWithStealthStrategy(Player):
             self.bid = self.model.public_signal_value + self.private_signal_value * self.stealth_factor - self.pm
         elif self.model.schedule.time >= time_reveal and self.aggregated_signal > self.pm:
             self.bid = self.aggregated_signal - self.pm
-        self.bid_queue.append((self.bid, self.aggregated_signal))
 
 class PlayerWithBluffStrategy(Player):
     def __init__(self, unique_id, model, pm, delay, probability, time_estimate, time_reveal_epsilon, bluff_factor):
@@ -100,7 +101,6 @@ class PlayerWithBluffStrategy(Player):
             self.bid = self.model.public_signal_value + self.bluff_factor * self.private_signal_value - self.pm
         elif self.aggregated_signal > self.pm:
             self.bid = self.aggregated_signal - self.pm
-        self.bid_queue.append((self.bid, self.aggregated_signal))
 
 def get_current_bids(model):
     return model.show_current_bids
@@ -119,15 +119,32 @@ def get_aggregated_signal_max(model):
 
 class Auction(Model):
     def __init__(self, N, A, L, S, B, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd,
-                 T_mean, T_sd, delay):
+                 T_mean, T_sd, delay, presample_signals=True, collection='full', collect_every=100, profiler=None,
+                 signal_stream=None):
         self.num_agents = {'Naive': N, 'Adaptive': A, 'LastMinute': L, 'Stealth': S, 'Bluff': B}
         self.global_delay = delay
         self.T = norm.rvs(loc=T_mean, scale=T_sd)
         self.schedule = SimultaneousActivation(self)
         self.setup_agents()
-        self.setup_signals(rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd)
+        self.setup_private_values()
+        self.setup_signals(rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd, presample_signals,
+                           signal_stream)
         self.setup_bids()
         self.setup_winner()
+        self.setup_collection(collection, collect_every)
+        self.profiler = profiler  # Optional profiling.PhaseTimer
+
+    def setup_collection(self, collection, collect_every):
+        # full keeps Mesa's DataCollector, final and sampled keep NumPy buffers, none stores nothing per tick
+        if collection not in COLLECTION_LEVELS:
+            raise ValueError(f"collection must be one of {COLLECTION_LEVELS}, not {collection}")
+        self.collection = collection
+        self.datacollector = None
+        self.recorder = None
+        if collection in ('final', 'sampled'):
+            self.recorder = TickRecorder(int(self.T * 100), len(self.schedule.agents), collection, collect_every)
+        if collection != 'full':
+            return
         self.datacollector = DataCollector(
             model_reporters={
                 "Current Bids" : get_current_bids,
@@ -219,7 +236,17 @@ class Auction(Model):
     #             self.schedule.add(agent)
     #             agent_id += 1
 
-    def setup_signals(self, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd):
+    def setup_private_values(self):
+        # Keep the private signal value of every agent in one array, so a signal is delivered to all of them at once
+        self.agent_probabilities = np.array([agent.probability for agent in self.schedule.agents])
+        self.private_signal_values = np.zeros(len(self.agent_probabilities))
+        self.agent_list = list(self.schedule.agents)
+        self.agent_ids = [agent.unique_id for agent in self.agent_list]
+        for index, agent in enumerate(self.schedule.agents):
+            agent.index = index
+
+    def setup_signals(self, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd,
+                      presample_signals=True, signal_stream=None):
         # Initialize signal parameters
         self.public_signal = 0
         self.public_signal_value = 0
@@ -236,11 +263,20 @@ class Auction(Model):
             self.private_lambda = norm.rvs(loc=rate_private_mean, scale=rate_private_sd)
             if self.private_lambda > 0:
                 break
+        # Draw the signals of every tick the auction runs for up front, step() then only looks them up
+        # A given stream (e.g. a slot of replay.TraceReplay) replaces the draws, only its delivery is sampled
+        self.signal_stream = signal_stream
+        if signal_stream is not None:
+            self.signal_stream.draw_delivery(self.agent_probabilities)
+        elif presample_signals:
+            self.signal_stream = sample_signal_stream(self.public_lambda, self.private_lambda, int(self.T * 100),
+                                                      MAIN_SIGNALS)
+            self.signal_stream.draw_delivery(self.agent_probabilities)
 
     def setup_bids(self):
+        self.bid_line = BidDelayLine([agent.delay + self.global_delay for agent in self.schedule.agents])
         self.max_bids = []
-        self.current_bids = []
-        self.bid_agents = []
+        self.winning_bid = None  # Winning bid of the latest tick any bid reached the relay, what Adaptive outbids
         self.winning_agents = []
         self.show_current_bids = []
         self.show_bid_agents = []
@@ -252,7 +288,28 @@ class Auction(Model):
         self.winner_probability = 0
         self.auction_efficiency = 0
 
-    def step(self):
+    def read_signals(self):
+        self.read_public_signals()
+        self.read_private_signals()
+
+    def read_public_signals(self):
+        # Look up the pre-sampled public signal totals of the current tick
+        tick = self.schedule.time
+        self.public_signal = self.signal_stream.public_signal[tick]
+        self.public_signal_value = self.signal_stream.public_signal_value[tick]
+
+    def read_private_signals(self):
+        # Look up the pre-sampled private signal totals and deliver the tick's private signals
+        tick = self.schedule.time
+        self.private_signal = self.signal_stream.private_signal[tick]
+        self.private_signal_max = self.signal_stream.private_signal_max[tick]
+        self.private_signal_values += self.signal_stream.private_increments(tick)
+
+    def sample_signals(self):
+        self.sample_public_signals()
+        self.sample_private_signals()
+
+    def sample_public_signals(self):
         # Update public signal
         new_public_signal = poisson.rvs(mu=self.public_lambda)
         self.public_signal += new_public_signal
@@ -262,6 +319,7 @@ class Auction(Model):
             # Add the value of the current public signal to the total value
             self.public_signal_value += signal_value
 
+    def sample_private_signals(self):
         # Update private signal
         new_private_signal = poisson.rvs(mu=self.private_lambda)
         self.private_signal += new_private_signal
@@ -273,40 +331,73 @@ class Auction(Model):
                 if random.random() < agent.probability :
                     agent.private_signal_value += private_signal_value
 
+    def release_bids(self):
+        # Queue the bids the agents computed at this tick and submit the ones leaving the delay line, in agent order
+        # like the advance phase used to
+        self.bid_line.push([agent.bid for agent in self.agent_list],
+                           [agent.aggregated_signal for agent in self.agent_list])
+        return self.bid_line.release()
+
+    def select_winner(self, matured, bids, aggregated_signals):
+        # Take the highest released bid, ties are broken with one uniform draw like random.choice over the tied bids.
+        # The winner's row in the agent table gives its id and probability without scanning the agents
+        ties = np.flatnonzero(bids == bids.max())
+        selected = ties[random.randrange(len(ties))]
+        row = matured[selected]
+        winning_bid = float(bids[selected])
+        winner_aggregated_signal = float(aggregated_signals[selected])
+        self.winning_bid = winning_bid
+        self.max_bids.append(winning_bid)
+        self.winning_agents.append(self.agent_ids[row])
+        self.winner_profit = winner_aggregated_signal - winning_bid
+        if self.aggregated_signal_max == 0:
+            self.auction_efficiency = 0
+        else:
+            self.auction_efficiency = winning_bid / self.aggregated_signal_max
+        self.winner_aggregated_signal = winner_aggregated_signal
+        self.winner_probability = self.agent_probabilities[row]
+
+    def step(self):
+        tick = self.schedule.time
+        profiler = self.profiler
+        if profiler is not None:
+            lap = profiler.start()
+
+        if self.signal_stream is not None:
+            self.read_public_signals()
+        else:
+            self.sample_public_signals()
+        if profiler is not None:
+            lap = profiler.lap('public_signals', lap)
+
+        if self.signal_stream is not None:
+            self.read_private_signals()
+        else:
+            self.sample_private_signals()
         self.aggregated_signal_max = self.public_signal_value + self.private_signal_max
+        if profiler is not None:
+            lap = profiler.lap('private_signals', lap)
 
         self.schedule.step()
+        matured, bids, aggregated_signals = self.release_bids()
+        if profiler is not None:
+            lap = profiler.lap('agents', lap)
 
         # select the winner of the step
-        if self.current_bids :
-            max_bid_value = max(bid for bid, _ in self.current_bids)
-            # Get all bids that are equal to the maximum bid value
-            max_bids = [(bid, agent_id) for bid, agent_id in zip(self.current_bids, self.bid_agents) if
-                        bid[0] == max_bid_value]
-            # Randomly select one of the maximum bids
-            selected_bid, winner_id = random.choice(max_bids)
-            self.max_bids.append(selected_bid[0])
-            self.winning_agents.append(winner_id)
-            self.winner_profit = selected_bid[1]-selected_bid[0]
-            if self.aggregated_signal_max == 0:
-                self.auction_efficiency = 0
-            else:
-                self.auction_efficiency = selected_bid[0]/self.aggregated_signal_max
-
-            for agent in self.schedule.agents:
-                if agent.unique_id == winner_id:
-                    self.winner_aggregated_signal = selected_bid[1]
-                    self.winner_probability = agent.probability
-
-
-        self.show_current_bids = self.current_bids.copy()
-        self.show_bid_agents = self.bid_agents.copy()
-
-        self.current_bids.clear()
-        self.bid_agents.clear()
+        if len(matured):
+            self.select_winner(matured, bids, aggregated_signals)
+        if profiler is not None:
+            lap = profiler.lap('winner', lap)
 
         # Collect data at the end of the step
-        self.datacollector.collect(self)
+        if self.datacollector is not None:
+            self.show_current_bids = list(zip(bids.tolist(), aggregated_signals.tolist()))
+            self.show_bid_agents = [self.agent_ids[index] for index in matured]
+            self.datacollector.collect(self)
+        elif self.recorder is not None:
+            self.recorder.record(self, tick, len(matured) > 0)
+        if profiler is not None:
+            profiler.lap('collection', lap)
 
 # # Function to run the model and collect data
 # model = Auction(N=2, A=2, L=2, S=2, B=2, rate_public_mean=0.0905, rate_public_sd=0.0371, rate_private_mean=0.0487, rate_private_sd=0.0241, T_mean=12, T_sd=0, delay=10)
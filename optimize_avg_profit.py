@@ -1,18 +1,12 @@
-import pandas as pd
 import matplotlib.pyplot as plt
+from running_stats import load_aggregates
 
-# Load the CSV file
-df = pd.read_csv("combined_test_files.csv")
+# Load the aggregates of the simulation results, by agent index and strategy of the winning player
+summary = load_aggregates("combined_test_files.parquet").summary(['agent', 'strategy'])
 
 for index in range(8):
-    # Filter rows where last character of winning_agent matches index
-    df_filtered = df[df["winning_agent"].str[-1] == str(index)].copy()
-
-    # Extract first letter of winning_agent
-    df_filtered["agent_group"] = df_filtered["winning_agent"].str[0]
-
-    # Group by first letter and compute average profit
-    grouped_avg = df_filtered.groupby("agent_group")["Profit"].mean()
+    # Average profit by first letter of winning_agent, for the winners with this agent index
+    grouped_avg = summary.loc[summary.index.get_level_values('agent') == index, 'mean_Profit'].droplevel('agent')
 
     # Fixed color map for agent groups
     color_map = {
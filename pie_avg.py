@@ -1,14 +1,10 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+from running_stats import load_aggregates
 
-# Load CSV
-df = pd.read_csv("combined_test_files.csv")
-
-# Group by winning_agent
-total_profit = df.groupby("winning_agent")["Profit"].sum()
-win_count = df["winning_agent"].value_counts()
-avg_profit = (total_profit / win_count).sort_values(ascending=False)
+# Load the aggregates of the simulation results, by winning_agent
+winners = load_aggregates("combined_test_files.parquet").winning_agents()
+avg_profit = (winners['sum_Profit'] / winners['wins']).sort_values(ascending=False)
 
 # Top 10 + Others
 top_avg = avg_profit.head(10)
@@ -1,12 +1,12 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+from running_stats import load_aggregates
 
-# Load CSV
-df = pd.read_csv("combined_test_files.csv")
+# Load the aggregates of the simulation results, by winning_agent
+winners = load_aggregates("combined_test_files.parquet").winning_agents()
 
-# Group by agent and sum profits
-profit_sums = df.groupby("winning_agent")["Profit"].sum().sort_values(ascending=False)
+# Sum profits by agent
+profit_sums = winners['sum_Profit'].sort_values(ascending=False)
 
 # Top 10 agents + Others
 top_profits = profit_sums.head(10)
@@ -1,9 +1,9 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+from results import read_results
 
-# Load CSV
-df = pd.read_csv("combined_test_files.csv")
+# Load the simulation results
+df = read_results("combined_test_files.parquet")
 
 # Count wins
 win_counts = df["winning_agent"].value_counts().sort_values(ascending=False)
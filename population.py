@@ -0,0 +1,325 @@
+# Description: Large-population mode of the array engine, for markets of thousands of heterogeneous builders instead
+# of the nine seats of main_final.py. Builders are drawn from the block counts in builders_data.csv (or a lognormal
+# fitted to them) and a builder's size sets how much private order flow it sees and how fast it reaches the relay.
+# PopulationAuction keeps no per-agent delay queues: all builders with the same queue length release together, so for
+# every group it stores only the top-k bids at the ticks where bids can change (signal arrivals, reveal times, relay
+# updates for Adaptive agents). Between those ticks the relay works on at most groups x k bids whatever the population
+# size, and the memory of the delay line no longer grows with the number of builders.
+
+import argparse
+import heapq
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from results import RESULT_DTYPES, write_results
+from signals import MAIN_FINAL_SIGNALS, sample_signal_stream
+from strategies import AGENT_PARAMETERS, STRATEGIES, StrategyKernels, get_strategy, sample_value, strategy_prefixes
+from vector_engine import RESULT_COLUMNS, STRATEGY_PREFIXES
+
+# Lognormal fitted to the block counts of the builder keys in generate.py, used when builders_data.csv is missing
+BUILDER_BLOCKS_LOGNORMAL = {'mean': 5.4121, 'sigma': 2.6167}
+
+# Parameter ranges spanned from the smallest to the largest builders: large builders receive more of the private
+# order flow and sit closer to the relays
+SIZE_PARAMETERS = {
+    'probability': [0.8, 1.0],
+    'delay': [50, 0],
+}
+
+DEFAULT_STRATEGY_SHARES = {'Naive': 0.2, 'Adaptive': 0.2, 'LastMinute': 0.2, 'Stealth': 0.2, 'Bluff': 0.2}
+
+POPULATION_COLUMNS = RESULT_COLUMNS + ['winning_builder', 'n_builders']
+POPULATION_DTYPES = dict(RESULT_DTYPES, winning_builder=object, n_builders=np.int64)
+
+
+def load_builders(path='builders_data.csv'):
+    # Label and block count of every builder key, rows without a readable count are dropped
+    frame = pd.read_csv(path)
+    blocks = pd.to_numeric(frame['Blocks'].astype(str).str.replace(',', ''), errors='coerce')
+    builders = pd.DataFrame({'label': frame['Label'], 'blocks': blocks}).dropna()
+    return builders[builders['blocks'] > 0].reset_index(drop=True)
+
+
+def builder_population(n_builders, rng, path='builders_data.csv', fitted=False, strategy_shares=None):
+    # Draw n_builders builders with their agent parameters. Sizes are resampled from the builders in path, or drawn
+    # from BUILDER_BLOCKS_LOGNORMAL with fitted or when the file does not exist. Strategies are assigned by
+    # strategy_shares ({strategy name: share}), the remaining parameters come from the strategies' defaults
+    builders = None
+    if not fitted:
+        try:
+            builders = load_builders(path)
+        except FileNotFoundError:
+            builders = None
+    if builders is None:
+        blocks = rng.lognormal(BUILDER_BLOCKS_LOGNORMAL['mean'], BUILDER_BLOCKS_LOGNORMAL['sigma'], n_builders)
+        labels = np.full(n_builders, 'fitted', dtype=object)
+        # Size quantile under the fitted distribution
+        quantile = norm.cdf(np.log(blocks), BUILDER_BLOCKS_LOGNORMAL['mean'], BUILDER_BLOCKS_LOGNORMAL['sigma'])
+    else:
+        rows = rng.integers(0, len(builders), n_builders)
+        blocks = builders['blocks'].to_numpy(dtype=np.float64)[rows]
+        labels = builders['label'].to_numpy(dtype=object)[rows]
+        # Mid-rank quantile among the builders of the file, so equal sizes get equal parameters
+        observed = np.sort(builders['blocks'].to_numpy(dtype=np.float64))
+        quantile = (np.searchsorted(observed, blocks, side='left') +
+                    np.searchsorted(observed, blocks, side='right')) / (2 * len(observed))
+
+    shares = strategy_shares or DEFAULT_STRATEGY_SHARES
+    strategies = [get_strategy(name) for name in shares]
+    weights = np.array(list(shares.values()), dtype=np.float64)
+    choice = rng.choice(len(strategies), n_builders, p=weights / weights.sum())
+
+    population = {
+        'code': np.array([strategies[index].code for index in choice], dtype=np.int8),
+        'pm': sample_value(AGENT_PARAMETERS['pm'], n_builders, rng),
+        'probability': np.interp(quantile, [0, 1], SIZE_PARAMETERS['probability']),
+        # Delays stay on the 10 ms steps of main_final.py
+        'delay': (np.rint(np.interp(quantile, [0, 1], SIZE_PARAMETERS['delay']) / 10) * 10).astype(np.int64),
+        'factor': np.zeros(n_builders),
+        'time_estimate': np.zeros(n_builders),
+        'time_reveal_epsilon': np.zeros(n_builders),
+        'label': labels,
+        'blocks': blocks,
+    }
+    for index, strategy in enumerate(strategies):
+        members = choice == index
+        for name in ['factor', 'time_estimate', 'time_reveal_epsilon']:
+            spec = strategy.parameters.get(name, AGENT_PARAMETERS[name])
+            population[name][members] = sample_value(spec, members.sum(), rng)
+    prefixes = strategy_prefixes()
+    population['unique_ids'] = [prefixes[code] + str(index) for index, code in enumerate(population['code'])]
+    return population
+
+
+class PopulationAuction:
+    def __init__(self, population, delay, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd,
+                 T_mean, T_sd, rng, top_k=16, signal_params=MAIN_FINAL_SIGNALS, signal_stream=None):
+        # One auction of a builder_population at 10 ms ticks. A signal_stream with its delivery already drawn (e.g.
+        # by VectorAuction) is replayed as is, otherwise the signals come from rng and each private signal is
+        # delivered to the builders when it arrives
+        self.population = population
+        self.rng = rng
+        self.top_k = top_k
+        self.global_delay = delay
+        self.T = T_mean + T_sd * rng.standard_normal()
+        self.n_ticks = max(int(self.T * 100), 0)
+        self.code = population['code']
+        self.pm = population['pm']
+        self.probability = population['probability']
+        self.factor = population['factor']
+        self.time_reveal = (population['time_estimate'] - population['time_reveal_epsilon'] - delay -
+                            population['delay']).astype(np.float64)
+        self.kernels = StrategyKernels(self.code)
+        self.setup_groups()
+        if signal_stream is None:
+            public_lambda = positive_value(rng, rate_public_mean, rate_public_sd)
+            private_lambda = positive_value(rng, rate_private_mean, rate_private_sd)
+            signal_stream = sample_signal_stream(public_lambda, private_lambda, self.n_ticks, signal_params, rng)
+        self.signal_stream = signal_stream
+        self.private_signal_value = np.zeros(len(self.code))
+        self.bid = np.zeros(len(self.code))
+
+    def setup_groups(self):
+        # Builders sorted by queue length, so every group is a slice of the sorted order
+        queue_length = self.population['delay'] + self.global_delay
+        if len(queue_length) and queue_length.min() < 1:
+            raise ValueError("delay + global delay must be at least one tick")
+        self.order = np.argsort(queue_length, kind='stable')
+        self.group_lengths, starts = np.unique(queue_length[self.order], return_index=True)
+        self.group_slices = [slice(int(start), int(end)) for start, end in
+                             zip(starts, list(starts[1:]) + [len(queue_length)])]
+
+    def top_bids(self, aggregated_signal):
+        # Top-k bids of every group as (groups x k) arrays of bids, signals, agents and tie weights, padded with
+        # -inf bids. When more than k builders of a group tie for its best bid, the kept ones are a random subset and
+        # carry the weight of all of them, so the relay's tie-break stays uniform over every tied builder
+        k = self.top_k
+        shape = (len(self.group_slices), k)
+        bids, signals = np.full(shape, -np.inf), np.zeros(shape)
+        agents, weights = np.zeros(shape, dtype=np.int64), np.ones(shape)
+        for group, members in enumerate(self.group_slices):
+            agent_order = self.order[members]
+            group_bids = self.bid[agent_order]
+            if len(group_bids) > k:
+                kept = np.argpartition(-group_bids, k - 1)[:k]
+            else:
+                kept = np.arange(len(group_bids))
+            best = group_bids[kept].max()
+            tied = np.flatnonzero(group_bids == best)
+            kept_tied = group_bids[kept] == best
+            if len(tied) > kept_tied.sum():
+                kept[kept_tied] = self.rng.choice(tied, kept_tied.sum(), replace=False)
+                weights[group, :len(kept)][kept_tied] = len(tied) / kept_tied.sum()
+            agents[group, :len(kept)] = agent_order[kept]
+            bids[group, :len(kept)] = group_bids[kept]
+            signals[group, :len(kept)] = aggregated_signal[agent_order[kept]]
+        return bids, signals, agents, weights
+
+    def run(self):
+        # Event-driven run: bids are only recomputed where they can change and the relay only where a group's
+        # released bids change. Returns the result row of the auction
+        stream = self.signal_stream
+        n_ticks = self.n_ticks
+        result = {'winning_agent': None, 'winning_bid_value': np.nan, 'winner_aggregated_signal': np.nan,
+                  'signal_max': np.nan, 'Profit': np.nan, 'Probability': np.nan, 'winning_builder': None}
+        if n_ticks == 0:
+            return result
+
+        timed = np.isin(self.code, [strategy.code for strategy in STRATEGIES.values() if strategy.timed])
+        has_adaptive = np.isin(self.code, [strategy.code for strategy in STRATEGIES.values()
+                                           if strategy.follows_relay]).any()
+        bid_events = {0}
+        for ticks in (stream.arrival_ticks(), np.unique(np.ceil(self.time_reveal[timed]))):
+            bid_events.update(int(tick) for tick in ticks if 0 <= tick < n_ticks)
+        relay_events = {int(length) - 1 for length in self.group_lengths if length - 1 < n_ticks}
+        relay_events.add(n_ticks - 1)
+        events = list(bid_events | relay_events)
+        heapq.heapify(events)
+        scheduled = set(events)
+
+        def schedule(tick, kind):
+            if tick < n_ticks:
+                kind.add(tick)
+                if tick not in scheduled:
+                    scheduled.add(tick)
+                    heapq.heappush(events, tick)
+
+        # Top-k snapshots at the bid events, the relay reads each group's latest snapshot old enough to be released
+        snapshot_ticks, snapshots = [], []
+        last_max, has_max = 0.0, False
+        private_start = 0
+        while events:
+            tick = heapq.heappop(events)
+            if tick in bid_events:
+                private_end = stream.private_offsets[tick + 1]
+                if private_end > private_start:
+                    values = stream.private_values[private_start:private_end]
+                    if stream.delivery is not None:
+                        self.private_signal_value += values @ stream.delivery[private_start:private_end]
+                    else:
+                        for value in values:
+                            self.private_signal_value[self.rng.random(len(self.code)) < self.probability] += value
+                    private_start = private_end
+                public = stream.public_signal_value[tick]
+                self.bid = self.kernels.bids(tick, public, self.private_signal_value, self.pm, self.factor,
+                                             self.time_reveal, self.bid, last_max, has_max)
+                snapshot_ticks.append(tick)
+                snapshots.append(self.top_bids(public + self.private_signal_value))
+                # The new bids reach the relay once they leave each group's queue
+                for length in self.group_lengths:
+                    schedule(tick + int(length) - 1, relay_events)
+
+            if tick in relay_events:
+                released = self.released_bids(tick, snapshot_ticks, snapshots)
+                if released is not None:
+                    max_bid = released[0].max()
+                    if has_adaptive and (not has_max or max_bid != last_max):
+                        schedule(tick + 1, bid_events)
+                    last_max, has_max = max_bid, True
+                    if tick == n_ticks - 1:
+                        self.record_winner(result, released, stream.public_signal_value[tick] +
+                                           stream.private_signal_max[tick])
+        return result
+
+    def released_bids(self, tick, snapshot_ticks, snapshots):
+        # Top bids of the groups whose queues have filled, from the snapshot taken queue length - 1 ticks earlier
+        parts = []
+        for group, length in enumerate(self.group_lengths):
+            if tick < length - 1:
+                continue
+            index = np.searchsorted(snapshot_ticks, tick - length + 1, side='right') - 1
+            parts.append([part[group] for part in snapshots[index]])
+        if not parts:
+            return None
+        return tuple(np.concatenate(columns) for columns in zip(*parts))
+
+    def record_winner(self, result, released, signal_max):
+        bids, signals, agents, weights = released
+        ties = np.flatnonzero(bids == bids.max())
+        winner = self.rng.choice(ties, p=weights[ties] / weights[ties].sum())
+        agent = agents[winner]
+        result['winning_agent'] = self.population['unique_ids'][agent]
+        result['winning_builder'] = self.population['label'][agent]
+        result['winning_bid_value'] = bids[winner]
+        result['winner_aggregated_signal'] = signals[winner]
+        result['signal_max'] = signal_max
+        result['Profit'] = signals[winner] - bids[winner]
+        result['Probability'] = self.probability[agent]
+        result['efficiency'] = 0 if signal_max == 0 else bids[winner] / signal_max
+
+
+def positive_value(rng, mean, sd):
+    # Sample until positive, like Auction.setup_signals
+    while True:
+        value = rng.normal(mean, sd)
+        if value > 0:
+            return value
+
+
+def simulate_population(population, n_auctions, delay=10, rate_public_mean=0.08183, rate_public_sd=0.0371,
+                        rate_private_mean=0.04404, rate_private_sd=0.0241, T_mean=12, T_sd=0, rng=None, top_k=16,
+                        signal_params=MAIN_FINAL_SIGNALS):
+    # Run n_auctions auctions of the same builder market, one row per auction with the columns of run_simulation plus
+    # the label of the winning builder
+    if rng is None:
+        rng = np.random.default_rng()
+    counts = {column: int(np.sum(population['code'] == code)) for code, column in enumerate(STRATEGY_PREFIXES)}
+    rows = []
+    for _ in range(n_auctions):
+        auction = PopulationAuction(population, delay, rate_public_mean, rate_public_sd, rate_private_mean,
+                                    rate_private_sd, T_mean, T_sd, rng, top_k, signal_params)
+        row = auction.run()
+        row.setdefault('efficiency', np.nan)
+        row.update({'True Profit': 0, 'auction_time': auction.n_ticks - 1, 'Delay': delay,
+                    'n_builders': len(population['code']), **counts})
+        rows.append(row)
+    return pd.DataFrame(rows, columns=POPULATION_COLUMNS)
+
+
+def benchmark_population(sizes, n_auctions=3, seed=0, top_k=16, fitted=False):
+    # Seconds per tick and peak memory of one auction for growing populations
+    records = []
+    for n_builders in sizes:
+        rng = np.random.default_rng(seed)
+        population = builder_population(n_builders, rng, fitted=fitted)
+        start = time.perf_counter()
+        frame = simulate_population(population, n_auctions, rng=rng, top_k=top_k)
+        elapsed = time.perf_counter() - start
+        ticks = int((frame['auction_time'] + 1).sum())
+        tracemalloc.start()
+        simulate_population(population, 1, rng=rng, top_k=top_k)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        record = {'builders': n_builders, 'auctions': n_auctions, 'seconds': elapsed,
+                  'us_per_tick': 1e6 * elapsed / ticks if ticks else float('nan'), 'peak_memory_bytes': peak_memory}
+        print(f"builders={n_builders:<7} {record['us_per_tick']:>9.1f} us/tick "
+              f"{peak_memory / 2 ** 20:>8.2f} MiB")
+        records.append(record)
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Auctions with thousands of builders drawn from builders_data.csv")
+    parser.add_argument('--builders', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=100, help="auctions of the builder market")
+    parser.add_argument('--delay', type=int, default=10)
+    parser.add_argument('--top-k', type=int, default=16, help="bids kept per queue-length group")
+    parser.add_argument('--data', default='builders_data.csv')
+    parser.add_argument('--fitted', action='store_true', help="draw sizes from the fitted lognormal")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--benchmark', default=None, help="comma separated population sizes to time instead")
+    parser.add_argument('--output', default='population_results.parquet')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_population([int(size) for size in args.benchmark.split(',')], seed=args.seed, top_k=args.top_k,
+                             fitted=args.fitted)
+    else:
+        rng = np.random.default_rng(args.seed)
+        population = builder_population(args.builders, rng, args.data, args.fitted)
+        results = simulate_population(population, args.runs, delay=args.delay, rng=rng, top_k=args.top_k)
+        write_results(results, args.output, columns=POPULATION_COLUMNS, dtypes=POPULATION_DTYPES)
+        print(results['winning_builder'].value_counts(normalize=True).head(10))
+        print(f'Results of {len(results)} auctions saved to {args.output}')
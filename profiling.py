@@ -0,0 +1,41 @@
+# Description: Per-phase wall-time accounting for Auction.step. A PhaseTimer passed to the auction models adds up the
+# time and call count of every phase of a tick (public signals, private signals and delivery, agent step/advance,
+# winner selection, data collection). One timer can be shared by every auction of a campaign, or merged from several,
+# and summary() gives the table of where the time went. Without a timer the models only pay a None check per phase.
+
+import time
+import pandas as pd
+
+# Phases of Auction.step, in the order they run
+PHASES = ['public_signals', 'private_signals', 'agents', 'winner', 'collection']
+
+
+class PhaseTimer:
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+
+    def start(self):
+        return time.perf_counter()
+
+    def lap(self, phase, start):
+        # Book the time since start to phase and return the current time as the start of the next phase
+        now = time.perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + now - start
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        return now
+
+    def merge(self, other):
+        # Add the totals of another timer, e.g. one per worker of a campaign
+        for phase, seconds in other.seconds.items():
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+            self.calls[phase] = self.calls.get(phase, 0) + other.calls[phase]
+        return self
+
+    def summary(self):
+        total = sum(self.seconds.values())
+        rows = [{'phase': phase, 'calls': self.calls[phase], 'total_seconds': seconds,
+                 'mean_microseconds': seconds / self.calls[phase] * 1e6 if self.calls[phase] else 0.0,
+                 'share': seconds / total if total else 0.0}
+                for phase, seconds in self.seconds.items()]
+        return pd.DataFrame(rows, columns=['phase', 'calls', 'total_seconds', 'mean_microseconds', 'share'])
@@ -0,0 +1,165 @@
+# Description: Trace replay for the auction models. A public/private transaction trace (the CSVs written by
+# generate_transactions.py, or classify.py output with a value column) is converted once into a directory of raw
+# binary columns, arrival timestamp in ms and value in ETH, that is memory-mapped on every use. Each 12 s slot window of the
+# trace then drives an auction as its public and private signals instead of the Poisson/lognormal draws, one at a time
+# as a SignalStream or thousands at once through simulate_batch.
+
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from results import write_results
+from signals import MAIN_FINAL_SIGNALS, SignalStream, signal_batch
+from vector_engine import simulate_batch
+
+TRACE_COLUMNS = {'time': np.int64, 'value': np.float64}
+SIDES = ['public', 'private']
+
+WEI_PER_ETH = 1e18
+
+
+def column_path(directory, side, column):
+    return os.path.join(directory, f'{side}_{column}.bin')
+
+
+def convert_trace(public_csv, private_csv, directory, time_column='timestamp_ms', value_column='value',
+                  chunk_size=1000000):
+    # Stream both CSVs in chunks into the binary columns of directory. Timestamps are kept in ms and values are
+    # stored in ETH (the CSVs hold wei). Slots are counted from the first transaction of either file
+    os.makedirs(directory, exist_ok=True)
+    origin = None
+    counts = {}
+    for side, path in zip(SIDES, (public_csv, private_csv)):
+        count = 0
+        ordered = True
+        last_time = None
+        with open(column_path(directory, side, 'time'), 'wb') as times, \
+                open(column_path(directory, side, 'value'), 'wb') as values:
+            for chunk in pd.read_csv(path, usecols=[time_column, value_column], chunksize=chunk_size):
+                chunk_times = chunk[time_column].to_numpy(np.int64)
+                if len(chunk_times):
+                    origin = min(origin, int(chunk_times.min())) if origin is not None else int(chunk_times.min())
+                    ordered &= bool((np.diff(chunk_times) >= 0).all()) and (last_time is None or
+                                                                          chunk_times[0] >= last_time)
+                    last_time = chunk_times[-1]
+                times.write(chunk_times.tobytes())
+                values.write((chunk[value_column].to_numpy(np.float64) / WEI_PER_ETH).tobytes())
+                count += len(chunk)
+        if not ordered:
+            # classify.py sorts by block height first, put the arrivals in time order once here
+            sort_column(directory, side, count)
+        counts[side] = count
+    with open(os.path.join(directory, 'trace.json'), 'w') as file:
+        json.dump({'origin_ms': origin or 0, 'counts': counts, 'columns': {name: np.dtype(dtype).str
+                                                                      for name, dtype in TRACE_COLUMNS.items()}},
+                  file, indent=2)
+
+
+def sort_column(directory, side, count):
+    times = np.fromfile(column_path(directory, side, 'time'), dtype=np.int64, count=count)
+    values = np.fromfile(column_path(directory, side, 'value'), dtype=np.float64, count=count)
+    order = np.argsort(times, kind='stable')
+    times[order].tofile(column_path(directory, side, 'time'))
+    values[order].tofile(column_path(directory, side, 'value'))
+
+
+class TraceReplay:
+    def __init__(self, directory, slot_ms=12000, ticks_per_second=100, params=MAIN_FINAL_SIGNALS, origin_ms=None):
+        # params only supplies the starting public signal of every slot, like the Auction models start from it.
+        # origin_ms is the start of slot 0, the first transaction of the trace by default
+        with open(os.path.join(directory, 'trace.json')) as file:
+            self.meta = json.load(file)
+        self.columns = {}
+        for side in SIDES:
+            count = self.meta['counts'][side]
+            for column, dtype in TRACE_COLUMNS.items():
+                path = column_path(directory, side, column)
+                self.columns[side, column] = (np.memmap(path, dtype=dtype, mode='r', shape=(count,)) if count
+                                              else np.zeros(0, dtype=dtype))
+        self.slot_ms = slot_ms
+        self.tick_ms = 1000 / ticks_per_second
+        self.params = params
+        self.origin = self.meta['origin_ms'] if origin_ms is None else origin_ms
+        end = max((self.columns[side, 'time'][-1] for side in SIDES if len(self.columns[side, 'time'])),
+                  default=self.origin)
+        self.n_slots = int((end - self.origin) // slot_ms) + 1
+
+    def window_counts(self, side, slots, n_ticks):
+        # Arrivals of every slot's first n_ticks ticks as (slots x ticks) counts, with the values of the arrivals in
+        # slot then time order
+        times = self.columns[side, 'time']
+        starts = self.origin + np.asarray(slots, dtype=np.int64) * self.slot_ms
+        lower = np.searchsorted(times, starts)
+        upper = np.searchsorted(times, starts + n_ticks * self.tick_ms)
+        sizes = upper - lower
+        slot_of = np.repeat(np.arange(len(starts)), sizes)
+        index = np.repeat(lower - np.concatenate(([0], np.cumsum(sizes)[:-1])), sizes) + np.arange(sizes.sum())
+        ticks = ((times[index] - starts[slot_of]) // self.tick_ms).astype(np.int64)
+        counts = np.bincount(slot_of * n_ticks + ticks, minlength=len(starts) * n_ticks).reshape(len(starts), n_ticks)
+        return counts, np.asarray(self.columns[side, 'value'][index])
+
+    def signal_stream(self, slot, n_ticks):
+        # Signals of one slot for main.Auction, main_final.Auction or VectorAuction (signal_stream=...)
+        public_counts, public_values = self.window_counts('public', [slot], n_ticks)
+        private_counts, private_values = self.window_counts('private', [slot], n_ticks)
+        return SignalStream(public_counts[0], public_values, private_counts[0], private_values,
+                            self.params['public_signal'], self.params['public_signal_value'])
+
+    def signal_batch(self, auctions, n_ticks, params=None, first_slot=0):
+        # Signals of auctions first_slot + auctions in the layout of signals.sample_signal_batch, for simulate_batch
+        slots = first_slot + np.asarray(auctions)
+        public_counts, public_values = self.window_counts('public', slots, n_ticks)
+        private_counts, private_values = self.window_counts('private', slots, n_ticks)
+        return signal_batch(public_counts, public_values, private_counts, private_values, params or self.params)
+
+
+class SlotSource:
+    # Signal source for simulate_batch replaying consecutive slots from first_slot on
+    def __init__(self, trace, first_slot=0):
+        self.trace = trace
+        self.first_slot = first_slot
+
+    def signal_batch(self, auctions, n_ticks, params=None):
+        return self.trace.signal_batch(auctions, n_ticks, params, self.first_slot)
+
+
+def replay_slots(trace, strategies, first_slot=0, n_slots=None, delay=10, rng=None, chunk_size=1000, **kwargs):
+    # Run one auction per slot of the trace with simulate_batch and return its rows with a slot column. Every
+    # auction lasts one slot unless T_mean/T_sd are given
+    if n_slots is None:
+        n_slots = trace.n_slots - first_slot
+    kwargs.setdefault('T_mean', trace.slot_ms / 1000)
+    frame = simulate_batch(strategies, n_slots, delay=delay, rng=rng, chunk_size=chunk_size,
+                           signal_source=SlotSource(trace, first_slot), **kwargs)
+    frame['slot'] = np.arange(first_slot, first_slot + n_slots)
+    return frame
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert transaction traces and replay them through the auction")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="convert public/private transaction CSVs to a binary trace")
+    convert.add_argument('public_csv')
+    convert.add_argument('private_csv')
+    convert.add_argument('directory')
+    convert.add_argument('--time-column', default='timestamp_ms')
+    convert.add_argument('--value-column', default='value')
+    replay = commands.add_parser('replay', help="run one auction per slot of a converted trace")
+    replay.add_argument('directory')
+    replay.add_argument('--first-slot', type=int, default=0)
+    replay.add_argument('--slots', type=int, default=None)
+    replay.add_argument('--delay', type=int, default=10)
+    replay.add_argument('--seed', type=int, default=None)
+    replay.add_argument('--output', default='replay_results.parquet')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        convert_trace(args.public_csv, args.private_csv, args.directory, args.time_column, args.value_column)
+        print(f'Trace saved to {args.directory}')
+    else:
+        trace = TraceReplay(args.directory)
+        results = replay_slots(trace, {'N': 1, 'A': 1, 'L': 2, 'S': 4, 'B': 1}, args.first_slot, args.slots,
+                               args.delay, np.random.default_rng(args.seed))
+        write_results(results, args.output, columns=results.columns)
+        print(f'Replayed {len(results)} slots, results saved to {args.output}')
@@ -0,0 +1,114 @@
+# Description: Columnar sink and reader for simulation results. ResultWriter buffers per-auction records in
+# preallocated typed NumPy columns and flushes every full buffer as one row group of a compressed Parquet file, instead
+# of growing a DataFrame row by row and appending small CSV chunks. read_results loads Parquet (or older CSV) result
+# files back into one DataFrame for compile.py and the analysis scripts.
+
+import glob
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from vector_engine import RESULT_COLUMNS
+
+# Column types of the rows written by run_simulation and simulate_batch
+RESULT_DTYPES = {
+    'winning_agent': object,
+    'winning_bid_value': np.float64,
+    'winner_aggregated_signal': np.float64,
+    'signal_max': np.float64,
+    'Profit': np.float64,
+    'Probability': np.float64,
+    'True Profit': np.float64,
+    'efficiency': np.float64,
+    'auction_time': np.int64,
+    'N': np.int64,
+    'A': np.int64,
+    'L': np.int64,
+    'S': np.int64,
+    'B': np.int64,
+    'Delay': np.int64,
+}
+
+ARROW_TYPES = {object: pa.string(), np.float64: pa.float64(), np.int64: pa.int64()}
+
+
+class ResultWriter:
+    def __init__(self, path, columns=RESULT_COLUMNS, dtypes=RESULT_DTYPES, batch_size=100000, compression='zstd'):
+        self.path = path
+        self.columns = list(columns)
+        self.dtypes = {column: dtypes.get(column, np.float64) for column in self.columns}
+        self.batch_size = batch_size
+        self.compression = compression
+        self.buffers = {column: np.empty(batch_size, dtype=self.dtypes[column]) for column in self.columns}
+        self.schema = pa.schema([(column, ARROW_TYPES[self.dtypes[column]]) for column in self.columns])
+        self.size = 0
+        self.rows_written = 0
+        self.writer = None
+
+    def append(self, row):
+        # Add one record, given as a sequence in column order or as a dict keyed by column
+        if not isinstance(row, dict):
+            row = dict(zip(self.columns, row))
+        for column in self.columns:
+            self.buffers[column][self.size] = row[column]
+        self.size += 1
+        if self.size == self.batch_size:
+            self.flush()
+
+    def extend(self, frame):
+        # Add every row of a DataFrame with the result columns, copying it into the buffers a slice at a time
+        start = 0
+        while start < len(frame):
+            count = min(self.batch_size - self.size, len(frame) - start)
+            for column in self.columns:
+                self.buffers[column][self.size:self.size + count] = frame[column].to_numpy()[start:start + count]
+            self.size += count
+            start += count
+            if self.size == self.batch_size:
+                self.flush()
+
+    def flush(self):
+        # Write the buffered records as one row group
+        if self.size == 0:
+            return
+        table = pa.table({column: self.buffers[column][:self.size] for column in self.columns}, schema=self.schema)
+        self.open().write_table(table)
+        self.rows_written += self.size
+        self.size = 0
+
+    def open(self):
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+        return self.writer
+
+    def close(self):
+        # Flush what is left, writing an empty file if no record ever arrived
+        self.flush()
+        self.open().close()
+        self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_results(frame, path, **kwargs):
+    with ResultWriter(path, **kwargs) as writer:
+        writer.extend(frame)
+
+
+def read_results(pattern, columns=None, head=None):
+    # Read every result file matching the pattern (Parquet, or CSV from older runs) into one DataFrame. head keeps
+    # only the first rows of each file, like compile.py does with its shards
+    frames = []
+    for path in sorted(glob.glob(pattern)):
+        if path.endswith('.parquet'):
+            frame = pq.read_table(path, columns=columns).to_pandas()
+        else:
+            frame = pd.read_csv(path, usecols=columns)
+        frames.append(frame if head is None else frame.head(head))
+    if not frames:
+        raise FileNotFoundError(f"no result files match {pattern}")
+    return pd.concat(frames, ignore_index=True)
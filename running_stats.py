@@ -0,0 +1,149 @@
+# Description: Running aggregates of simulation outcomes, kept while a campaign runs instead of recomputed by every
+# analysis script from the full result file. Each chunk of results is reduced to counts, sums and sums of squares of
+# Profit and efficiency and to win counts, keyed by configuration (strategy mix and delay), strategy letter and agent
+# index of the winner. Sums merge by addition, so the aggregates of chunks, workers or whole campaigns combine in any
+# order, and the means, spreads and win ratios the plotting scripts need can be read at any point of a run.
+
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from results import read_results
+
+CONFIGURATION_COLUMNS = ['N', 'A', 'L', 'S', 'B', 'Delay']
+VALUE_COLUMNS = ['Profit', 'efficiency']
+KEY_COLUMNS = ['strategy', 'agent']
+
+
+def outcome_statistics(frame, configuration=CONFIGURATION_COLUMNS):
+    # One row of sums per (configuration, strategy, agent) of the rows in frame. Auctions without a winner are kept
+    # under strategy '' and agent -1, so runs still counts every auction of a configuration
+    winner = frame['winning_agent'].fillna('').astype(str)
+    columns = {
+        'strategy': winner.str[:1].to_numpy(dtype=object),
+        'agent': pd.to_numeric(winner.str[1:], errors='coerce').fillna(-1).to_numpy(dtype=np.int64),
+        'runs': np.ones(len(frame), dtype=np.int64),
+        'wins': (winner != '').to_numpy().astype(np.int64),
+    }
+    for column in VALUE_COLUMNS:
+        values = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+        columns[f'count_{column}'] = present.astype(np.int64)
+        columns[f'sum_{column}'] = np.where(present, values, 0.0)
+        columns[f'sumsq_{column}'] = np.where(present, values ** 2, 0.0)
+    statistics = pd.DataFrame(columns, index=frame.index)
+    for column in configuration:
+        statistics[column] = frame[column].to_numpy(dtype=np.int64)
+    return statistics.groupby(list(configuration) + KEY_COLUMNS).sum()
+
+
+class RunningAggregates:
+    def __init__(self, table=None, configuration=CONFIGURATION_COLUMNS, results=None):
+        self.configuration = list(configuration)
+        if table is None:
+            table = outcome_statistics(pd.DataFrame(columns=['winning_agent'] + VALUE_COLUMNS + self.configuration),
+                                       self.configuration)
+        self.table = table
+        # results_fingerprint of the finished results file these aggregates were saved for, None while it is written
+        self.results = results
+
+    def update(self, frame):
+        # Add a chunk of result rows
+        return self.merge(RunningAggregates(outcome_statistics(frame, self.configuration), self.configuration))
+
+    def merge(self, other):
+        # Add the aggregates of another worker or campaign, in place
+        tables = [table for table in [self.table, other.table] if len(table)]
+        if tables:
+            self.table = pd.concat(tables).groupby(level=self.configuration + KEY_COLUMNS).sum()
+        return self
+
+    def save(self, path, results=None):
+        # results is the results_fingerprint of a finished results file they cover, kept in the Parquet metadata
+        table = pa.Table.from_pandas(self.table.reset_index(), preserve_index=False)
+        metadata = dict(table.schema.metadata or {}, running_stats=json.dumps({'results': results}))
+        pq.write_table(table.replace_schema_metadata(metadata), path)
+
+    @classmethod
+    def load(cls, path, configuration=CONFIGURATION_COLUMNS):
+        stored = pq.read_table(path)
+        table = stored.to_pandas()
+        configuration = [column for column in configuration if column in table.columns]
+        info = json.loads((stored.schema.metadata or {}).get(b'running_stats', b'{}'))
+        return cls(table.set_index(configuration + KEY_COLUMNS), configuration, info.get('results'))
+
+    def totals(self, by):
+        # Sums over every key but the levels in by, e.g. ['strategy'] or ['agent', 'strategy']
+        return self.table.groupby(level=by).sum()
+
+    def summary(self, by):
+        # Wins, win ratio among the wins of the group's parent levels, and the mean, standard deviation and sum of
+        # every value column for each group of by. Auctions without a winner are left out
+        totals = self.totals(by)
+        totals = totals[totals.index.get_level_values('strategy') != ''] if 'strategy' in by else totals
+        summary = pd.DataFrame({'wins': totals['wins']}, index=totals.index)
+        if len(by) > 1:
+            summary['win_ratio'] = totals['wins'] / totals['wins'].groupby(level=by[:-1]).transform('sum')
+        else:
+            summary['win_ratio'] = totals['wins'] / totals['wins'].sum()
+        for column in VALUE_COLUMNS:
+            count, total, squares = (totals[f'{name}_{column}'] for name in ['count', 'sum', 'sumsq'])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                summary[f'mean_{column}'] = total / count
+                summary[f'sd_{column}'] = np.sqrt(np.maximum(squares - total ** 2 / count, 0) / (count - 1))
+            summary[f'sum_{column}'] = total
+        return summary
+
+    def winning_agents(self):
+        # Wins and Profit per winning agent id (strategy letter and agent index), like grouping by winning_agent
+        totals = self.totals(KEY_COLUMNS)
+        totals = totals[totals.index.get_level_values('strategy') != '']
+        totals.index = [f'{strategy}{agent}' for strategy, agent in totals.index]
+        return totals[['wins', 'count_Profit', 'sum_Profit']]
+
+    def runs(self):
+        return int(self.table['runs'].sum())
+
+    def mean(self, column):
+        totals = self.table[[f'count_{column}', f'sum_{column}']].sum()
+        return totals[f'sum_{column}'] / totals[f'count_{column}']
+
+
+def aggregates_path(results_path):
+    # The aggregates kept next to a result file, e.g. combined_test_files.aggregates.parquet
+    return os.path.splitext(results_path)[0] + '.aggregates.parquet'
+
+
+def results_fingerprint(results_path):
+    # Row count, size and modification time of a finished results file, None while it is missing or, for Parquet,
+    # still being written (the footer with the row count only comes with ResultWriter.close)
+    try:
+        stat = os.stat(results_path)
+        rows = pq.ParquetFile(results_path).metadata.num_rows if results_path.endswith('.parquet') else None
+    except (OSError, pa.ArrowInvalid):
+        return None
+    return {'rows': rows, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def is_current(aggregates, path, results_path):
+    # Aggregates saved for a finished results file hold its fingerprint and must still match it. Aggregates saved
+    # while a campaign runs have none: they cover its finished chunks, and are the only numbers there are until its
+    # results file is complete. A complete results file written after them replaces them
+    fingerprint = results_fingerprint(results_path)
+    if aggregates.results is not None:
+        return aggregates.results == fingerprint
+    return fingerprint is None or os.path.getmtime(results_path) <= os.path.getmtime(path)
+
+
+def load_aggregates(results_path):
+    # Aggregates of a result file: the ones saved next to it by the campaign runner or compile.py, or a single pass
+    # over the file when there are none or they do not match it. While a campaign is still writing the file they are
+    # those of the chunks it has finished
+    path = aggregates_path(results_path)
+    if os.path.exists(path):
+        aggregates = RunningAggregates.load(path)
+        if is_current(aggregates, path, results_path):
+            return aggregates
+    return RunningAggregates().update(read_results(results_path))
@@ -1,10 +1,15 @@
 # Description: This file is used to run the simulation for the auction model. It uses the main.py file to run the simulation and saves the results to a csv file.
 
+import glob
+import os
 import random
 import pandas as pd
 from collections import Counter
-import os
 from main_final import Auction
+from profiling import PhaseTimer
+from results import ResultWriter, read_results, write_results
+from running_stats import results_fingerprint
+from vector_engine import RESULT_COLUMNS
 import sys
 
 def generate_strategies(manual_values=None):
@@ -23,27 +28,54 @@ def generate_strategies(manual_values=None):
     return strategies
 
 index = sys.argv[1]
+# Optional per-phase timing of Auction.step: python runscript.py <index> --profile
+profiler = PhaseTimer() if '--profile' in sys.argv[2:] else None
 
 def run_simulation(strategies, delay, num_simulations):
-    sim_results = pd.DataFrame(columns=['winning_agent', 'winning_bid_value', 'winner_aggregated_signal', 'signal_max','Profit', 'Probability', 'True Profit', 'efficiency', 'auction_time', 'N', 'A', 'L', 'S', 'B', 'Delay'])  # Add 'Aggregated Signal Max' to columns
+    # Collect plain rows and build the frame once, appending with .loc copies the frame on every row
+    rows = []
     for j in range(num_simulations):
         N, A, L, S, B = strategies.values()
         model = Auction(N, A, L, S, B, rate_public_mean=0.08183, rate_public_sd=0.0371, rate_private_mean=0.04404, rate_private_sd=0.0241,
-                        T_mean=12, T_sd=0, delay=delay)
+                        T_mean=12, T_sd=0, delay=delay, collection='none', profiler=profiler)
         for i in range(int(model.T * 100)):
             model.step()
         time_step = int(model.T * 100) - 1
-        sim_results.loc[len(sim_results)] = [model.winning_agents[-1:][0], model.max_bids[-1:][0],model.winner_aggregated_signal, model.aggregated_signal_max,
-                                             model.winner_profit, model.winner_probability, model.winner_trueprofit, model.auction_efficiency, time_step, N, A, L, S, B, delay]
+        rows.append([model.winning_agents[-1:][0], model.max_bids[-1:][0],model.winner_aggregated_signal, model.aggregated_signal_max,
+                     model.winner_profit, model.winner_probability, model.winner_trueprofit, model.auction_efficiency, time_step, N, A, L, S, B, delay])
 
-    return sim_results
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
 
 manual_values = None
 num_simulations = 1
 num_runs = 5000
 all_results = pd.DataFrame(columns=['Fixed Strategy', 'Chances of Winning', 'Mean Winning Bid Value', 'Delay'])
 
+# Results are buffered in typed columns and closed into a Parquet part every checkpoint_runs runs, so a shard that
+# crashes keeps the runs it finished (compile.py reads the parts of a shard without a d{index}.parquet). Like the CSV
+# this script used to append to, a rerun keeps the earlier runs: the parts of a crashed run and the d{index}.parquet of
+# a finished one become the first parts, new parts are numbered after them, and all of them are merged into
+# d{index}.parquet at the end
+checkpoint_runs = 250
+filename = f'd{index}.parquet'
+part_pattern = f'd{index}.part*.parquet'
+
+def part_name(part):
+    return f'd{index}.part{part:06d}.parquet'
+
+# A part is only written when it is closed, a crash while closing it leaves it without its footer and unreadable
+for path in glob.glob(part_pattern):
+    if results_fingerprint(path) is None:
+        os.remove(path)
+part = max([int(path.split('.part')[1].split('.')[0]) + 1 for path in glob.glob(part_pattern)], default=0)
+if os.path.exists(filename):
+    os.replace(filename, part_name(part))
+    part += 1
+writer = None
+
 for run in range(num_runs):
+    if writer is None:
+        writer = ResultWriter(part_name(part), batch_size=checkpoint_runs)
     all_sim_results = []
     for fixed_strategy in [None]:
         print('Run ' + str(run))
@@ -54,10 +86,19 @@ for run in range(num_runs):
         all_sim_results.append(sim_results)
 
     concatenated_sim_results = pd.concat(all_sim_results, ignore_index=True)
-    filename = f'd{index}.csv'
-    if os.path.exists(filename):
-        concatenated_sim_results.to_csv(filename, mode='a', header=False, index=False)
-    else:   
-        # If the file doesn't exist, write the header
-        concatenated_sim_results.to_csv(filename, header=True, index=False)
-    print(f'Simulation results saved to {filename}')
\ No newline at end of file
+    writer.extend(concatenated_sim_results)
+    if (run + 1) % checkpoint_runs == 0:
+        writer.close()
+        writer = None
+        part += 1
+
+if writer is not None:
+    writer.close()
+parts = glob.glob(part_pattern)
+write_results(read_results(part_pattern), filename + '.tmp')
+os.replace(filename + '.tmp', filename)
+for path in parts:
+    os.remove(path)
+print(f'Simulation results saved to {filename}')
+if profiler is not None:
+    print(profiler.summary().to_string(index=False))
\ No newline at end of file
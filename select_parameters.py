@@ -1,9 +1,9 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+from results import read_results
 
-# Load the CSV
-df = pd.read_csv("combined_test_files.csv")  # Replace with actual filename
+# Load the simulation results
+df = read_results("combined_test_files.parquet")  # Replace with actual filename
 
 # Extract agent group from the first letter of winning_agent
 df["agent_group"] = df["winning_agent"].str[0]
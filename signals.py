@@ -0,0 +1,107 @@
+# Description: Pre-sampled public/private signal arrival streams for the auction models. All Poisson arrivals and
+# lognormal values of an auction are drawn up front and stored as cumulative arrays indexed by tick, so Auction.step
+# only has to look up the totals for the current tick instead of calling poisson.rvs and np.random.lognormal.
+
+import numpy as np
+
+# Signal value distributions and starting public signal of main.py
+MAIN_SIGNALS = {
+    'public_mean': -9.7408,
+    'public_sigma': 0.8544,
+    'private_mean': -8.3500,
+    'private_sigma': 0.8792,
+    'public_signal': 0,
+    'public_signal_value': 0,
+}
+
+# Signal value distributions and starting public signal of main_final.py
+MAIN_FINAL_SIGNALS = {
+    'public_mean': -9.85,
+    'public_sigma': 0.80,
+    'private_mean': -8.45,
+    'private_sigma': 0.85,
+    'public_signal': 16,
+    'public_signal_value': 0.0011648,
+}
+
+
+class SignalStream:
+    def __init__(self, public_counts, public_values, private_counts, private_values, public_signal=0,
+                 public_signal_value=0):
+        self.n_ticks = len(public_counts)
+        self.public_offsets = np.concatenate(([0], np.cumsum(public_counts)))
+        # Offsets into private_values: the private signals of tick t are private_values[offsets[t]:offsets[t + 1]]
+        self.private_offsets = np.concatenate(([0], np.cumsum(private_counts)))
+        self.private_values = np.asarray(private_values, dtype=np.float64)
+
+        # Totals after the signals of tick t arrived. np.cumsum adds left to right, so the values round exactly
+        # like the running sums the models used to keep
+        self.public_signal = public_signal + self.public_offsets[1:]
+        self.public_signal_value = np.cumsum(np.concatenate(([public_signal_value],
+                                                             public_values)))[self.public_offsets[1:]]
+        self.private_signal = self.private_offsets[1:]
+        self.private_signal_max = np.cumsum(np.concatenate(([0], self.private_values)))[self.private_offsets[1:]]
+        self.delivery = None
+
+    def arrival_ticks(self):
+        # Ticks at which at least one public or private signal arrives
+        return np.flatnonzero(np.diff(self.public_offsets) + np.diff(self.private_offsets))
+
+    def private_signals(self, tick):
+        # Values of the private signals that arrive at this tick
+        return self.private_values[self.private_offsets[tick]:self.private_offsets[tick + 1]]
+
+    def draw_delivery(self, probability, rng=np.random):
+        # One Bernoulli mask (signals x agents) for the whole auction: agent j receives private signal i with its
+        # probability, the same distribution as one random.random() < probability coin flip per agent and signal
+        self.delivery = rng.random((len(self.private_values), len(probability))) < np.asarray(probability)
+
+    def private_increments(self, tick):
+        # Private value each agent receives at this tick, as one matrix-vector product over the tick's signals
+        start, end = self.private_offsets[tick], self.private_offsets[tick + 1]
+        return self.private_values[start:end] @ self.delivery[start:end]
+
+
+def sample_signal_stream(public_lambda, private_lambda, n_ticks, params=MAIN_FINAL_SIGNALS, rng=np.random):
+    # Draw the arrivals and values of a whole auction. rng is np.random by default, so the draws come from the
+    # global stream that np.random.seed controls, but any Generator or RandomState works too
+    public_counts = rng.poisson(public_lambda, n_ticks)
+    public_values = rng.lognormal(mean=params['public_mean'], sigma=params['public_sigma'], size=public_counts.sum())
+    private_counts = rng.poisson(private_lambda, n_ticks)
+    private_values = rng.lognormal(mean=params['private_mean'], sigma=params['private_sigma'],
+                                   size=private_counts.sum())
+    return SignalStream(public_counts, public_values, private_counts, private_values,
+                        params['public_signal'], params['public_signal_value'])
+
+
+def cell_sums(counts, values):
+    # Sum a flat array of signal values into the (auction, tick) cells they arrived in
+    cells = np.repeat(np.arange(counts.size), counts.ravel())
+    return np.bincount(cells, weights=values, minlength=counts.size).reshape(counts.shape)
+
+
+def sample_signal_batch(public_lambda, private_lambda, n_ticks, params=MAIN_FINAL_SIGNALS, rng=np.random):
+    # Batch version of sample_signal_stream for an array of auctions. Returns the (auctions x ticks) public signal
+    # value and private signal max totals, and the flat private signal values with the auction and tick of each
+    n_auctions = len(public_lambda)
+    public_counts = rng.poisson(np.asarray(public_lambda)[:, None], (n_auctions, n_ticks))
+    public_values = rng.lognormal(mean=params['public_mean'], sigma=params['public_sigma'], size=public_counts.sum())
+    private_counts = rng.poisson(np.asarray(private_lambda)[:, None], (n_auctions, n_ticks))
+    private_values = rng.lognormal(mean=params['private_mean'], sigma=params['private_sigma'],
+                                   size=private_counts.sum())
+    return signal_batch(public_counts, public_values, private_counts, private_values, params)
+
+
+def signal_batch(public_counts, public_values, private_counts, private_values, params=MAIN_FINAL_SIGNALS):
+    # Turn (auctions x ticks) arrival counts and the flat signal values, ordered by auction and then tick, into the
+    # arrays returned by sample_signal_batch
+    n_ticks = public_counts.shape[1]
+    public_increment = cell_sums(public_counts, public_values)
+    if n_ticks:
+        public_increment[:, 0] += params['public_signal_value']
+    public_signal_value = np.cumsum(public_increment, axis=1)
+
+    private_signal_max = np.cumsum(cell_sums(private_counts, private_values), axis=1)
+    private_cells = np.repeat(np.arange(private_counts.size), private_counts.ravel())
+    private_auction, private_tick = np.divmod(private_cells, max(n_ticks, 1))
+    return public_signal_value, private_signal_max, private_values, private_auction, private_tick
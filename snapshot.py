@@ -0,0 +1,104 @@
+# Description: Snapshots of a running auction for what-if studies. An AuctionSnapshot freezes an auction at its current
+# tick (agent state, delay buffers, winners so far, signal cursor and the global random/np.random states) and fork()
+# returns an independent auction that continues from that tick, optionally with changed agent parameters, so variants
+# that only differ late in the auction (reveal times, stealth/bluff factors) share the simulated prefix. Works for
+# VectorAuction, whose arrays are copied directly, and for the Mesa Auction models, which are deep-copied.
+
+import copy
+import random
+import numpy as np
+from vector_engine import VectorAuction
+
+# Per-tick state of a VectorAuction that a fork must not share with its snapshot
+VECTOR_STATE = ['private_signal_value', 'aggregated_signal', 'bid', 'queued_bids', 'queued_signals', 'max_bids',
+                'winning_agents']
+# Agent parameters a VectorAuction fork may change, the kernels read them every tick
+VECTOR_PARAMETERS = ['pm', 'factor', 'time_reveal']
+# Changing these would invalidate the presampled delivery or the delay buffers
+FIXED_PARAMETERS = ['delay', 'probability']
+
+
+def copy_auction(model):
+    if isinstance(model, VectorAuction):
+        # The agent parameters, kernels and signal stream are read-only while running and stay shared
+        clone = copy.copy(model)
+        for name in VECTOR_STATE:
+            setattr(clone, name, copy.copy(getattr(model, name)))
+        return clone
+    # Mesa models: share the pre-sampled signals and the profiler, copy everything else
+    memo = {}
+    for name in ['signal_stream', 'profiler']:
+        shared = getattr(model, name, None)
+        if shared is not None:
+            memo[id(shared)] = shared
+    return copy.deepcopy(model, memo)
+
+
+def current_tick(model):
+    return model.time if isinstance(model, VectorAuction) else model.schedule.time
+
+
+def total_ticks(model):
+    return model.n_ticks if isinstance(model, VectorAuction) else int(model.T * 100)
+
+
+class AuctionSnapshot:
+    def __init__(self, model):
+        # Mesa's Model.__new__ draws from the global random module when a model is copied, so the states are saved
+        # first and put back afterwards, leaving the original auction's streams untouched
+        self.random_state = random.getstate()
+        self.np_random_state = np.random.get_state()
+        self.model = copy_auction(model)
+        self.tick = current_tick(model)
+        random.setstate(self.random_state)
+
+    def fork(self, agents=None):
+        # New auction continuing from the snapshot. agents maps unique ids to changed parameters, e.g.
+        # {'B4': {'time_reveal': 1010}} on a VectorAuction or {'B4': {'time_reveal_epsilon': 200}} on a Mesa model.
+        # The global random streams are reset to the snapshot, so an unchanged fork replays the original run
+        model = copy_auction(self.model)
+        for unique_id, changes in (agents or {}).items():
+            set_agent_parameters(model, unique_id, changes)
+        random.setstate(self.random_state)
+        np.random.set_state(self.np_random_state)
+        return model
+
+
+def set_agent_parameters(model, unique_id, changes):
+    fixed = set(changes) & set(FIXED_PARAMETERS)
+    if fixed:
+        raise ValueError(f"{sorted(fixed)} cannot change after the auction started")
+    if isinstance(model, VectorAuction):
+        if unique_id not in model.unique_ids:
+            raise ValueError(f"unknown agent {unique_id}")
+        row = model.unique_ids.index(unique_id)
+        for name, value in changes.items():
+            if name not in VECTOR_PARAMETERS:
+                raise ValueError(f"unknown parameter {name}, a fork can change {VECTOR_PARAMETERS}")
+            # Copy on write, the arrays are shared with the snapshot
+            values = getattr(model, name).copy()
+            values[row] = value
+            setattr(model, name, values)
+        return
+    agent = next((agent for agent in model.schedule.agents if agent.unique_id == unique_id), None)
+    if agent is None:
+        raise ValueError(f"unknown agent {unique_id}")
+    for name, value in changes.items():
+        if not hasattr(agent, name):
+            raise ValueError(f"agent {unique_id} has no parameter {name}")
+        setattr(agent, name, value)
+
+
+def run_to_end(model):
+    for _ in range(total_ticks(model) - current_tick(model)):
+        model.step()
+    return model
+
+
+def run_variants(model, tick, variants):
+    # Run model up to tick, then every variant (an agents mapping for AuctionSnapshot.fork) from there to the end.
+    # Returns the finished variant auctions
+    for _ in range(tick - current_tick(model)):
+        model.step()
+    snapshot = AuctionSnapshot(model)
+    return [run_to_end(snapshot.fork(agents)) for agents in variants]
@@ -0,0 +1,218 @@
+# Description: Registry of the bidding strategies of the array engines. A strategy is declared once, as a kernel that
+# computes the bids of every agent playing it in one array call, together with its agent id prefix and the default
+# distributions of its parameters. vector_engine looks strategies up here instead of hard-coding them, and
+# agents_from_config builds agents from a plain list of strategy entries, so a new strategy only needs a kernel and a
+# register_strategy line to run at vectorized speed.
+
+import numpy as np
+
+# Small increment the adaptive strategy uses to outbid the highest current bid
+ADAPTIVE_DELTA = 0.0001
+
+STRATEGIES = {}
+
+# Parameters every agent has, with the ranges main_final.py draws the adaptive seat from
+AGENT_PARAMETERS = {
+    'pm': {'uniform': [0.005, 0.009]},
+    'delay': {'choice': [0, 10, 20, 30, 40, 50]},
+    'probability': {'uniform': [0.8, 1.0]},
+    'factor': 0.0,
+    'time_estimate': 1200,
+    'time_reveal_epsilon': 0,
+}
+
+
+class Strategy:
+    def __init__(self, name, prefix, code, kernel, timed=False, follows_relay=False, parameters=None):
+        self.name = name
+        self.prefix = prefix
+        self.code = code
+        self.kernel = kernel
+        # timed: the bid can change at the agent's reveal time, follows_relay: the bid can change when the winning
+        # bid on the relay changes. The event-driven engine only evaluates those ticks and the signal arrivals
+        self.timed = timed
+        self.follows_relay = follows_relay
+        self.parameters = parameters or {}
+
+
+class BidContext:
+    # Everything a kernel may read at one tick. Arrays are per agent, or (auctions x seats) in batch runs, with the
+    # auction-level values (public signal, winning bid, has_winning_bid) broadcast against them
+    def __init__(self, time, public_signal_value, private_signal_value, pm, factor, time_reveal, bid, winning_bid,
+                 has_winning_bid):
+        self.update(time, public_signal_value, private_signal_value, pm, factor, time_reveal, bid, winning_bid,
+                    has_winning_bid)
+
+    def update(self, time, public_signal_value, private_signal_value, pm, factor, time_reveal, bid, winning_bid,
+               has_winning_bid):
+        self.time = time
+        self.public_signal_value = public_signal_value
+        self.private_signal_value = private_signal_value
+        self.aggregated_signal = public_signal_value + private_signal_value
+        self.pm = pm
+        self.factor = factor
+        self.time_reveal = time_reveal
+        self.bid = bid
+        self.winning_bid = winning_bid
+        self.has_winning_bid = has_winning_bid
+        self.truthful_bid = self.aggregated_signal - pm
+        self.above_margin = self.aggregated_signal > pm
+        self.revealed = time >= time_reveal
+
+
+def register_strategy(name, prefix, timed=False, follows_relay=False, **parameters):
+    # Decorator adding a kernel to the registry. The kernel takes a BidContext holding the agents playing the strategy
+    # and returns their new bids. parameters overrides the AGENT_PARAMETERS defaults of agents_from_config (factor,
+    # time_reveal_epsilon, ...) for this strategy
+    unknown = set(parameters) - set(AGENT_PARAMETERS)
+    if unknown:
+        raise ValueError(f"unknown agent parameters {sorted(unknown)}, kernels can use {list(AGENT_PARAMETERS)}")
+
+    def register(kernel):
+        if name in STRATEGIES:
+            raise ValueError(f"strategy {name} is already registered")
+        if any(strategy.prefix == prefix for strategy in STRATEGIES.values()):
+            raise ValueError(f"agent id prefix {prefix} is already used")
+        STRATEGIES[name] = Strategy(name, prefix, len(STRATEGIES), kernel, timed, follows_relay, parameters)
+        return kernel
+    return register
+
+
+def get_strategy(name):
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown strategy {name}, registered: {list(STRATEGIES)}")
+    return STRATEGIES[name]
+
+
+def strategy_prefixes():
+    return [strategy.prefix for strategy in STRATEGIES.values()]
+
+
+@register_strategy('Naive', 'N')
+def naive_bids(context):
+    return np.where(context.above_margin, context.truthful_bid, context.bid)
+
+
+@register_strategy('Adaptive', 'A', follows_relay=True)
+def adaptive_bids(context):
+    outbid = context.winning_bid + ADAPTIVE_DELTA
+    adaptive = context.above_margin & context.has_winning_bid
+    return np.where(adaptive, np.where(context.truthful_bid > outbid, outbid, context.truthful_bid), context.bid)
+
+
+@register_strategy('LastMinute', 'L', timed=True)
+def last_minute_bids(context):
+    return np.where(context.revealed & context.above_margin, context.truthful_bid, context.bid)
+
+
+@register_strategy('Stealth', 'S', timed=True, factor={'uniform': [0.8, 1]})
+def stealth_bids(context):
+    shaded = ~context.revealed & (context.public_signal_value > context.pm)
+    bid = np.where(context.revealed & context.above_margin, context.truthful_bid, context.bid)
+    return np.where(shaded, context.public_signal_value + context.private_signal_value * context.factor - context.pm,
+                    bid)
+
+
+@register_strategy('Bluff', 'B', timed=True, factor={'uniform': [1, 1.2]}, time_reveal_epsilon=100)
+def bluff_bids(context):
+    bid = np.where(context.revealed & context.above_margin, context.truthful_bid, context.bid)
+    return np.where(~context.revealed,
+                    context.public_signal_value + context.factor * context.private_signal_value - context.pm, bid)
+
+
+# Below this many bids per tick the kernels run on every agent and the results are masked, which costs fewer NumPy
+# calls than gathering each strategy's columns
+SMALL_BID_ARRAY = 256
+
+
+class StrategyKernels:
+    # The kernels of the strategies present in a code array. Seats keep their strategy in every auction, so the code
+    # only varies along the last (agent) axis and on large arrays every kernel runs once per tick on the columns of its
+    # own agents
+    def __init__(self, code):
+        code = np.asarray(code)
+        seat_code = code.reshape(-1, code.shape[-1])[0] if code.size else np.zeros(0, dtype=np.int8)
+        if (code != seat_code).any():
+            raise ValueError("every auction must give a seat the same strategy")
+        self.masked = code.size <= SMALL_BID_ARRAY
+        # One context for every tick of the masked path, updated in place
+        self.context = None
+        self.groups = []
+        for strategy in STRATEGIES.values():
+            seats = np.flatnonzero(seat_code == strategy.code)
+            if not len(seats):
+                continue
+            if self.masked:
+                seats = seat_code == strategy.code
+            elif seats[-1] - seats[0] + 1 == len(seats):
+                # Consecutive seats are sliced, which avoids copying the columns
+                seats = slice(int(seats[0]), int(seats[-1]) + 1)
+            self.groups.append((seats, strategy.kernel))
+
+    def bids(self, time, public_signal_value, private_signal_value, pm, factor, time_reveal, bid, winning_bid,
+             has_winning_bid):
+        # New bid of every agent, the arguments are those of BidContext
+        if self.masked:
+            context = self.context
+            if context is None:
+                context = self.context = BidContext(time, public_signal_value, private_signal_value, pm, factor,
+                                                    time_reveal, bid, winning_bid, has_winning_bid)
+            else:
+                context.update(time, public_signal_value, private_signal_value, pm, factor, time_reveal, bid,
+                               winning_bid, has_winning_bid)
+            for mask, kernel in self.groups:
+                bid = np.where(mask, kernel(context), bid)
+            return bid
+        new_bid = np.empty(np.shape(bid))
+        for seats, kernel in self.groups:
+            context = BidContext(time, public_signal_value, private_signal_value[..., seats], pm[..., seats],
+                                 factor[..., seats], time_reveal[..., seats], bid[..., seats], winning_bid,
+                                 has_winning_bid)
+            new_bid[..., seats] = kernel(context)
+        return new_bid
+
+
+def sample_value(spec, size, rng):
+    # A spec is a constant, {'uniform': [low, high]} or {'choice': [values]}
+    if isinstance(spec, dict):
+        if 'uniform' in spec:
+            return rng.uniform(spec['uniform'][0], spec['uniform'][1], size)
+        if 'choice' in spec:
+            return rng.choice(np.asarray(spec['choice']), size)
+        raise ValueError(f"unknown value spec {spec}")
+    return np.full(size, spec)
+
+
+def agents_from_config(config, global_delay, rng=np.random, n_auctions=None):
+    # Build agent arrays from a list of entries like {'strategy': 'Stealth', 'count': 2, 'pm': {'uniform': [0.005,
+    # 0.007]}, 'delay': 10}. Parameters left out take the strategy's defaults, then AGENT_PARAMETERS. With n_auctions
+    # every array is (auctions x agents) with independent draws per auction, otherwise one row of agents.
+    # Returns the same fields as vector_engine.sample_agents plus the unique ids
+    shape = (n_auctions,) if n_auctions is not None else ()
+    columns = {name: [] for name in ['code', 'pm', 'delay', 'probability', 'time_reveal', 'factor']}
+    unique_ids = []
+    for entry in config:
+        strategy = get_strategy(entry['strategy'])
+        count = entry.get('count', 1)
+        unknown = set(entry) - {'strategy', 'count'} - set(AGENT_PARAMETERS)
+        if unknown:
+            raise ValueError(f"unknown parameters {sorted(unknown)} for strategy {strategy.name}")
+        values = {}
+        for name, default in AGENT_PARAMETERS.items():
+            spec = entry.get(name, strategy.parameters.get(name, default))
+            values[name] = sample_value(spec, shape + (count,), rng)
+        for _ in range(count):
+            unique_ids.append(strategy.prefix + str(len(unique_ids)))
+        columns['code'].append(np.full(shape + (count,), strategy.code, dtype=np.int8))
+        columns['pm'].append(values['pm'])
+        columns['delay'].append(values['delay'].astype(np.int64))
+        columns['probability'].append(values['probability'])
+        columns['factor'].append(values['factor'].astype(np.float64))
+        columns['time_reveal'].append((values['time_estimate'] - values['time_reveal_epsilon'] - global_delay -
+                                       values['delay']).astype(np.float64))
+    agents = {name: np.concatenate(parts, axis=-1) if parts else np.zeros(shape + (0,))
+              for name, parts in columns.items()}
+    agents['code'] = agents['code'].astype(np.int8)
+    agents['delay'] = agents['delay'].astype(np.int64)
+    agents['unique_ids'] = unique_ids
+    return agents
@@ -0,0 +1,194 @@
+# Description: Surrogate model of auction outcomes fitted on sweep or campaign results. Result rows are reduced to
+# sufficient statistics (runs, wins per strategy, sums and sums of squares of the winner Profit, the efficiency and
+# each strategy's profit per auction) for every configuration of strategy mix, global delay and swept agent
+# parameters. A query is answered from the matching configuration, or pooled from its nearest neighbours, with
+# confidence half-widths, in microseconds. query_outcomes only runs new auctions when the surrogate is unsure and
+# adds them to the model.
+
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from adaptive import DEFAULT_TARGETS
+from campaign import STRATEGY_LABELS
+from sweep import SWEEP_PARAMETERS
+from vector_engine import simulate_batch
+
+# Result columns describing a configuration; the swept agent parameters join them when the results have them
+MIX_FEATURES = STRATEGY_LABELS + ['Delay']
+PARAMETER_FEATURES = [name for name in SWEEP_PARAMETERS if name != 'delay']
+
+# Per-auction values whose means the surrogate predicts, profit_<label> is the label's winner profit or 0
+VALUE_COLUMNS = ['Profit', 'efficiency'] + [f'profit_{label}' for label in STRATEGY_LABELS]
+
+
+def configuration_statistics(frame, features):
+    # One row of sufficient statistics per configuration
+    frame = frame.copy()
+    labels = frame['winning_agent'].str[0]
+    columns = {'runs': np.ones(len(frame), dtype=np.int64)}
+    for label in STRATEGY_LABELS:
+        wins = (labels == label).to_numpy()
+        columns[f'wins_{label}'] = wins.astype(np.int64)
+        frame[f'profit_{label}'] = np.where(wins, frame['Profit'].fillna(0), 0.0)
+    for column in VALUE_COLUMNS:
+        values = frame[column].to_numpy(dtype=np.float64)
+        present = ~np.isnan(values)
+        columns[f'count_{column}'] = present.astype(np.int64)
+        columns[f'sum_{column}'] = np.where(present, values, 0.0)
+        columns[f'sumsq_{column}'] = np.where(present, values ** 2, 0.0)
+    statistics = pd.DataFrame(columns, index=frame.index)
+    for feature in features:
+        statistics[feature] = frame[feature].to_numpy(dtype=np.float64)
+    return statistics.groupby(features).sum()
+
+
+class Surrogate:
+    def __init__(self, table):
+        # table holds the statistics of configuration_statistics, indexed by the features
+        self.table = table
+        self.features = list(table.index.names)
+        self.points = np.array(table.index.tolist(), dtype=np.float64).reshape(len(table), len(self.features))
+        self.lookup = {tuple(point): row for row, point in enumerate(self.points)}
+        # Distances are measured in units of each feature's range in the data
+        self.scale = np.ptp(self.points, axis=0) if len(self.points) else np.ones(len(self.features))
+        self.scale[self.scale == 0] = 1
+        self.tree = cKDTree(self.points / self.scale) if len(self.points) else None
+        self.defaults = dict(zip(self.features, np.median(self.points, axis=0))) if len(self.points) else {}
+        self.runs = table['runs'].to_numpy(dtype=np.float64)
+        self.wins = table[[f'wins_{label}' for label in STRATEGY_LABELS]].to_numpy(dtype=np.float64)
+        self.count = table[[f'count_{column}' for column in VALUE_COLUMNS]].to_numpy(dtype=np.float64)
+        self.sum = table[[f'sum_{column}' for column in VALUE_COLUMNS]].to_numpy(dtype=np.float64)
+        self.sumsq = table[[f'sumsq_{column}' for column in VALUE_COLUMNS]].to_numpy(dtype=np.float64)
+        # Predictions already made, a repeated query is a dictionary lookup
+        self.predictions = {}
+
+    @classmethod
+    def fit(cls, frame, features=None):
+        if features is None:
+            features = MIX_FEATURES + [name for name in PARAMETER_FEATURES if name in frame.columns]
+        return cls(configuration_statistics(frame, features))
+
+    def update(self, frame):
+        # Add result rows, e.g. fresh simulations of a configuration the surrogate was unsure about
+        table = pd.concat([self.table, configuration_statistics(frame, self.features)])
+        return Surrogate(table.groupby(level=self.features).sum())
+
+    def save(self, path):
+        self.table.reset_index().to_parquet(path, index=False)
+
+    @classmethod
+    def load(cls, path, features=None):
+        table = pd.read_parquet(path)
+        if features is None:
+            features = [name for name in MIX_FEATURES + PARAMETER_FEATURES if name in table.columns]
+        return cls(table.set_index(features))
+
+    def point(self, query):
+        return np.array([query.get(feature, self.defaults.get(feature, 0.0)) for feature in self.features],
+                        dtype=np.float64)
+
+    def predict(self, query, k=8, z=1.96):
+        # Estimates for a configuration given as {'N': .., 'A': .., 'L': .., 'S': .., 'B': .., 'Delay': .., ...}.
+        # Features left out take the median of the data. Away from the data the half-widths also include the spread
+        # between the neighbours pooled for the answer
+        point = self.point(query)
+        key = (tuple(point), k, z)
+        if key in self.predictions:
+            return dict(self.predictions[key])
+        row = self.lookup.get(key[0])
+        if row is not None:
+            rows, nearest = np.array([row]), 0.0
+        else:
+            if self.tree is None:
+                raise ValueError("the surrogate has no data")
+            distances, rows = self.tree.query(point / self.scale, k=min(k, len(self.points)))
+            rows, nearest = np.atleast_1d(rows), float(np.min(distances))
+        runs = self.runs[rows].sum()
+        wins = self.wins[rows].sum(axis=0)
+        count, total, squares = self.count[rows].sum(axis=0), self.sum[rows].sum(axis=0), self.sumsq[rows].sum(axis=0)
+
+        # Agresti-Coull interval for the win ratios, like adaptive.OutcomeStats
+        adjusted = (wins + z ** 2 / 2) / (runs + z ** 2)
+        win_half_width = z * np.sqrt(adjusted * (1 - adjusted) / (runs + z ** 2))
+        win_ratio = wins / runs if runs else np.full(len(wins), np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / count
+            variance = np.maximum(squares - total ** 2 / count, 0) / (count - 1)
+            mean_half_width = np.where(count > 1, z * np.sqrt(variance / count), np.inf)
+            if len(rows) > 1:
+                spread_wins = (self.wins[rows] / self.runs[rows, None]).std(axis=0)
+                spread_means = (self.sum[rows] / self.count[rows]).std(axis=0)
+                win_half_width = np.sqrt(win_half_width ** 2 + (z * spread_wins) ** 2)
+                mean_half_width = np.sqrt(mean_half_width ** 2 + (z * np.nan_to_num(spread_means, nan=np.inf)) ** 2)
+
+        prediction = {'runs': int(runs), 'exact': row is not None, 'distance': nearest}
+        for index, label in enumerate(STRATEGY_LABELS):
+            prediction[f'win_ratio_{label}'] = win_ratio[index]
+            prediction[f'win_ratio_{label}_half_width'] = win_half_width[index]
+        for index, column in enumerate(VALUE_COLUMNS):
+            prediction[f'mean_{column}'] = mean[index]
+            prediction[f'mean_{column}_half_width'] = mean_half_width[index]
+        self.predictions[key] = prediction
+        return dict(prediction)
+
+
+def is_confident(prediction, targets=DEFAULT_TARGETS):
+    if any(prediction[f'win_ratio_{label}_half_width'] > targets['win_ratio'] for label in STRATEGY_LABELS):
+        return False
+    return all(prediction[f'mean_{column}_half_width'] <= targets[column] for column in ['Profit', 'efficiency'])
+
+
+def query_outcomes(surrogate, query, targets=DEFAULT_TARGETS, n_auctions=2000, rng=None, max_rounds=5):
+    # Answer from the surrogate when it is confident, otherwise simulate the configuration until it is. Returns the
+    # prediction and the (possibly updated) surrogate. The configuration is the full point predict answers for,
+    # features left out of the query included, so the simulated rows land on that point
+    configuration = dict(zip(surrogate.features, surrogate.point(query).tolist()))
+    prediction = surrogate.predict(configuration)
+    rounds = 0
+    while not is_confident(prediction, targets) and rounds < max_rounds:
+        mix = {label: int(configuration.get(label, 0)) for label in STRATEGY_LABELS}
+        agent_params = {name: configuration[name] for name in PARAMETER_FEATURES if name in configuration}
+        frame = simulate_batch(mix, n_auctions, delay=int(configuration.get('Delay', 10)), rng=rng, **agent_params)
+        for feature, value in configuration.items():
+            frame[feature] = value
+        surrogate = surrogate.update(frame)
+        prediction = surrogate.predict(configuration)
+        rounds += 1
+    prediction['simulated_rounds'] = rounds
+    return prediction, surrogate
+
+
+def parse_query(items):
+    return {name: float(value) for name, value in (item.split('=', 1) for item in items)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fit or query the auction outcome surrogate")
+    commands = parser.add_subparsers(dest='command', required=True)
+    fit = commands.add_parser('fit', help="fit a surrogate on result files")
+    fit.add_argument('results', help="result file or glob, e.g. sweep_results.parquet")
+    fit.add_argument('--output', default='surrogate.parquet')
+    query = commands.add_parser('query', help="estimate the outcomes of one configuration")
+    query.add_argument('surrogate')
+    query.add_argument('values', nargs='+', metavar='NAME=VALUE', help="e.g. N=0 A=3 L=0 S=1 B=2 Delay=20")
+    query.add_argument('--simulate', action='store_true', help="simulate when the surrogate is unsure")
+    query.add_argument('--runs', type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        from results import read_results
+        surrogate = Surrogate.fit(read_results(args.results))
+        surrogate.save(args.output)
+        print(f'Surrogate of {len(surrogate.points)} configurations saved to {args.output}')
+    else:
+        surrogate = Surrogate.load(args.surrogate)
+        values = parse_query(args.values)
+        if args.simulate:
+            prediction, updated = query_outcomes(surrogate, values, n_auctions=args.runs)
+            if prediction['simulated_rounds']:
+                updated.save(args.surrogate)
+        else:
+            prediction = surrogate.predict(values)
+        for name, value in prediction.items():
+            print(f'{name}: {value}')
@@ -0,0 +1,179 @@
+# Description: Parameter sweeps over the global delay, time_reveal_epsilon, stealth_factor and bluff_factor, instead
+# of editing the constants in setup_agents and the delay loop in runscript.py. A parameter space is turned into points
+# (full grid, random or Latin hypercube), the points are split into chunks of auctions and scheduled across a process
+# pool, and every finished chunk is cached in the sweep directory under a key derived from the point, the number of
+# runs, the seed, the chunk size and the fixed strategy mix, so growing the grid only simulates the new cells.
+
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from campaign import chunk_sizes, run_chunk, write_atomic
+from common_random import CommonRandomNumbers
+from results import read_results, write_results
+from vector_engine import RESULT_COLUMNS
+
+# Parameters a sweep can vary; delay is the global delay, the others go to the timed strategies
+SWEEP_PARAMETERS = ['delay', 'time_reveal_epsilon', 'stealth_factor', 'bluff_factor']
+
+
+def grid_points(space):
+    # Every combination of the listed values, space maps a parameter to its values
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def scale_point(space, units):
+    # Map values in [0, 1) onto the (low, high) range of every parameter, integer ranges give integers
+    point = {}
+    for name, unit in zip(space, units):
+        low, high = space[name]
+        if isinstance(low, int) and isinstance(high, int):
+            point[name] = int(low + np.floor(unit * (high - low + 1)))
+        else:
+            point[name] = float(low + unit * (high - low))
+    return point
+
+
+def random_points(space, n_points, rng):
+    # Independent uniform draws, space maps a parameter to its (low, high) range
+    units = rng.random((n_points, len(space)))
+    return [scale_point(space, row) for row in units]
+
+
+def latin_hypercube_points(space, n_points, rng):
+    # One point in each of n_points equal strata of every parameter, with the strata of different parameters paired
+    # at random
+    units = np.stack([(rng.permutation(n_points) + rng.random(n_points)) / n_points for _ in space], axis=1)
+    return [scale_point(space, row) for row in units.reshape(n_points, len(space))]
+
+
+def point_key(point, runs_per_point, seed, chunk_size, manual_values=None, common_random=False):
+    # Everything the cached chunks of a point depend on: a different chunk size splits and seeds the auctions
+    # differently, and manual_values fixes their strategy mix
+    description = {'point': point, 'runs': runs_per_point, 'seed': seed, 'chunk_size': chunk_size,
+                   'manual_values': manual_values}
+    if common_random:
+        description['common_random'] = True
+    description = json.dumps(description, sort_keys=True)
+    return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+
+def chunk_seeds(key, seed, n_chunks, common_random=False):
+    # SeedSequences of the chunks of a point. With common random numbers every point takes the same chunk seeds from
+    # the sweep seed, under spawn key (1,) so they stay apart from the auction streams of CommonRandomNumbers
+    if common_random:
+        return np.random.SeedSequence(seed, spawn_key=(1,)).spawn(n_chunks)
+    return np.random.SeedSequence(int(key, 16)).spawn(n_chunks)
+
+
+def chunk_path(directory, key, chunk):
+    return os.path.join(directory, f'point-{key}-{chunk:06d}.parquet')
+
+
+def save_chunk(directory, key, chunk, frame):
+    write_atomic(chunk_path(directory, key, chunk), lambda path: write_results(frame, path, columns=frame.columns))
+
+
+def run_point_chunk(point, n_auctions, seed_sequence, manual_values=None, common=None, first_auction=0):
+    for name in point:
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError(f"unknown sweep parameter {name}")
+    agent_params = {name: value for name, value in point.items() if name != 'delay'}
+    frame = run_chunk(n_auctions, seed_sequence, point.get('delay', 10), manual_values, agent_params, common,
+                      first_auction)
+    # Keep the swept values next to the results, like the time_reveal_epsilon column reveal.py groups by
+    for name, value in agent_params.items():
+        frame[name] = value
+    return frame
+
+
+def run_sweep(directory, points, runs_per_point, seed=0, workers=None, chunk_size=250, manual_values=None,
+              common_random=False):
+    # Simulate runs_per_point auctions for every point and return their rows. Chunks already in the directory are
+    # read back instead of simulated; the seed is part of the cache key, so keep it fixed to reuse earlier work.
+    # With common_random every point replays the same auctions: signals, delivery and durations come from
+    # common_random.CommonRandomNumbers keyed by auction index, and strategy mixes and agents from the same chunk
+    # seeds, so the rows of two points can be compared pairwise with common_random.paired_difference.
+    os.makedirs(directory, exist_ok=True)
+    sizes = chunk_sizes(runs_per_point, chunk_size)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(int)
+    keys = [point_key(point, runs_per_point, seed, chunk_size, manual_values, common_random) for point in points]
+    common = CommonRandomNumbers(seed) if common_random else None
+
+    tasks = []
+    for point, key in zip(points, keys):
+        children = chunk_seeds(key, seed, len(sizes), common_random)
+        for chunk, (size, child) in enumerate(zip(sizes, children)):
+            if not os.path.exists(chunk_path(directory, key, chunk)):
+                tasks.append((point, key, chunk, size, child))
+
+    if workers is None:
+        workers = os.cpu_count()
+    if workers == 1 or len(tasks) <= 1:
+        for point, key, chunk, size, child in tasks:
+            save_chunk(directory, key, chunk, run_point_chunk(point, size, child, manual_values, common,
+                                                              starts[chunk]))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            futures = {pool.submit(run_point_chunk, point, size, child, manual_values, common, starts[chunk]):
+                       (key, chunk) for point, key, chunk, size, child in tasks}
+            for future in as_completed(futures):
+                save_chunk(directory, *futures[future], future.result())
+
+    frames = [read_results(path) for key in dict.fromkeys(keys)
+              for path in sorted(glob.glob(os.path.join(directory, f'point-{key}-*.parquet')))]
+    if not frames:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def parse_values(text):
+    return [json.loads(value) for value in text.split(',')]
+
+
+def add_space_arguments(parser):
+    # Command line options describing the parameter space, shared with adaptive.py
+    parser.add_argument('directory', help="cache directory of the sweep")
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1,V2,...')
+    parser.add_argument('--range', action='append', default=[], metavar='NAME=LOW,HIGH')
+    parser.add_argument('--random', type=int, default=0, metavar='POINTS', help="sample the ranges at random")
+    parser.add_argument('--lhs', type=int, default=0, metavar='POINTS', help="sample the ranges by Latin hypercube")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=250)
+
+
+def points_from_arguments(args):
+    grid = dict(item.split('=', 1) for item in args.grid)
+    ranges = dict(item.split('=', 1) for item in args.range)
+    points = grid_points({name: parse_values(values) for name, values in grid.items()})
+    if ranges:
+        space = {name: tuple(parse_values(values)) for name, values in ranges.items()}
+        rng = np.random.default_rng(args.seed)
+        sampled = (latin_hypercube_points(space, args.lhs, rng) if args.lhs else
+                   random_points(space, args.random, rng))
+        # Combine every sampled point with every grid cell
+        points = [dict(cell, **sample) for cell in points for sample in sampled]
+    return points
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep delay, reveal epsilon, stealth and bluff factors")
+    add_space_arguments(parser)
+    parser.add_argument('--runs', type=int, default=1000, help="auctions per point")
+    parser.add_argument('--output', default='sweep_results.parquet')
+    parser.add_argument('--common-random', action='store_true',
+                        help="run every point on the same auctions, for paired comparisons")
+    args = parser.parse_args()
+
+    points = points_from_arguments(args)
+    results = run_sweep(args.directory, points, args.runs, seed=args.seed, workers=args.workers,
+                        chunk_size=args.chunk_size, common_random=args.common_random)
+    write_results(results, args.output, columns=results.columns)
+    print(f'Sweep results of {len(points)} points saved to {args.output}')
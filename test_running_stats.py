@@ -0,0 +1,39 @@
+import pandas as pd
+from campaign import run_campaign, write_campaign
+from results import ResultWriter
+from running_stats import RunningAggregates, aggregates_path, load_aggregates
+
+
+def test_aggregates_while_campaign_runs(tmp_path):
+    # An earlier, finished campaign left a results file at the same path
+    path = str(tmp_path / 'results.parquet')
+    for _ in write_campaign(path, 30, seed=1, workers=1, chunk_size=10):
+        pass
+
+    seen = []
+    for aggregates in write_campaign(path, 40, seed=2, workers=1, chunk_size=10):
+        loaded = load_aggregates(path)
+        assert loaded.runs() == aggregates.runs()
+        seen.append(loaded.runs())
+    assert seen == [10, 20, 30, 40]
+
+    finished = load_aggregates(path)
+    assert finished.results is not None
+    expected = RunningAggregates().update(run_campaign(40, seed=2, workers=1, chunk_size=10))
+    pd.testing.assert_frame_equal(finished.table, expected.table)
+
+
+def test_aggregates_of_unfinished_results_file(tmp_path):
+    # Past its first flush the results file exists but has no footer until it is closed
+    path = str(tmp_path / 'results.parquet')
+    frame = run_campaign(20, seed=3, workers=1, chunk_size=10)
+    writer = ResultWriter(path, batch_size=5)
+    writer.extend(frame)
+    aggregates = RunningAggregates().update(frame)
+    aggregates.save(aggregates_path(path))
+    assert load_aggregates(path).runs() == 20
+
+    # Once the file is complete and newer, aggregates without its fingerprint are recomputed from it
+    writer.extend(frame)
+    writer.close()
+    assert load_aggregates(path).runs() == 40
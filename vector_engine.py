@@ -0,0 +1,651 @@
+# Description: Struct-of-arrays engine for the auction model in main_final.py. Agent state (profit margin, delay,
+# probability, private signal, bid, strategy code) is kept in NumPy arrays and every tick is evaluated with array
+# operations instead of Mesa's per-agent step()/advance() dispatch. The global random/np.random streams are consumed
+# in the same order as main_final.Auction, so for a fixed seed it produces the same winners, bids and efficiency.
+# Bids come from the strategy kernels registered in strategies.py.
+
+import heapq
+import operator
+import random
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from signals import MAIN_FINAL_SIGNALS, sample_signal_batch, sample_signal_stream
+from strategies import STRATEGIES, StrategyKernels, agents_from_config, get_strategy, strategy_prefixes
+
+# Codes of the strategies of main_final.py, in the same order as the agent id prefixes
+NAIVE, ADAPTIVE, LASTMINUTE, STEALTH, BLUFF = (STRATEGIES[name].code
+                                               for name in ['Naive', 'Adaptive', 'LastMinute', 'Stealth', 'Bluff'])
+STRATEGY_PREFIXES = ['N', 'A', 'L', 'S', 'B']
+
+# Strategy of each seat in main_final.Auction.setup_agents, which assigns strategies by agent id
+SEAT_STRATEGIES = [STEALTH, LASTMINUTE, STEALTH, LASTMINUTE, BLUFF, NAIVE, STEALTH, STEALTH, ADAPTIVE]
+
+# From this many ticks on, select_winner draws the tie-breaks of the ticks between events in one call
+BULK_TIE_BREAKS = 128
+
+# Per-auction result columns, as written by run_simulation in runscript.py
+RESULT_COLUMNS = ['winning_agent', 'winning_bid_value', 'winner_aggregated_signal', 'signal_max', 'Profit',
+                  'Probability', 'True Profit', 'efficiency', 'auction_time', 'N', 'A', 'L', 'S', 'B', 'Delay']
+
+
+class VectorAuction:
+    def __init__(self, N, A, L, S, B, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd,
+                 T_mean, T_sd, delay, presample_signals=True, ticks_per_second=100, agents=None, signal_stream=None):
+        # Mesa's Model.__new__ draws a seed from the global random module, mirror it to keep the streams aligned
+        random.random()
+        self.num_agents = {'Naive': N, 'Adaptive': A, 'LastMinute': L, 'Stealth': S, 'Bluff': B}
+        # Rates, delays and reveal times are given per 10 ms tick like in main_final.py and rescaled when the auction
+        # runs at a finer (or coarser) resolution
+        self.ticks_per_second = ticks_per_second
+        self.tick_scale = ticks_per_second / 100
+        self.global_delay = delay
+        self.T = norm.rvs(loc=T_mean, scale=T_sd)
+        self.n_ticks = int(self.T * ticks_per_second)
+        self.time = 0
+        if agents is None:
+            self.setup_agents()
+        else:
+            self.setup_config_agents(agents)
+        self.setup_kernels()
+        self.setup_signals(rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd, presample_signals,
+                           signal_stream)
+        self.setup_bids()
+        self.setup_winner()
+
+    def setup_agents(self):
+        # Same seat layout and random draws as main_final.Auction.setup_agents
+        items = list(self.num_agents.items())
+        random.shuffle(items)
+
+        unique_ids, code, pm, delay, probability, time_reveal, factor = [], [], [], [], [], [], []
+        agent_id = 0
+        for strategy, count in items:
+            for _ in range(count):
+
+                if agent_id % 2 == 0:
+                    agent_pm = random.uniform(0.005, 0.007)
+                else:
+                    agent_pm = random.uniform(0.007, 0.009)
+                if agent_id % 4 < 2:
+                    agent_delay = random.choice([0, 10, 20])
+                else:
+                    agent_delay = random.choice([30, 40, 50])
+                if agent_id < 4:
+                    agent_probability = np.random.uniform(0.8, 0.9)
+                else:
+                    agent_probability = np.random.uniform(0.9, 1.0)
+
+                time_estimate = 1200
+                time_reveal_epsilon = 0
+                agent_factor = 0
+                if agent_id == 8:
+                    agent_pm = random.uniform(0.005, 0.009)
+                    agent_delay = random.choice([0, 10, 20, 30, 40, 50])
+                    agent_probability = np.random.uniform(0.8, 1.0)
+                    agent_code = ADAPTIVE
+                if agent_id in [1, 3]:
+                    agent_code = LASTMINUTE
+                if agent_id in [0, 2, 6, 7]:
+                    agent_factor = random.uniform(0.8, 1)
+                    agent_code = STEALTH
+                if agent_id == 4:
+                    agent_factor = random.uniform(1, 1.2)
+                    time_reveal_epsilon = 100
+                    agent_code = BLUFF
+                if agent_id == 5:
+                    agent_code = NAIVE
+
+                # main_final only defines nine seats; a tenth adds the ninth agent to the scheduler again, which
+                # Mesa rejects
+                if agent_id >= 9:
+                    raise ValueError("agent already added to scheduler")
+                unique_ids.append(STRATEGY_PREFIXES[agent_code] + str(agent_id))
+                code.append(agent_code)
+                pm.append(agent_pm)
+                delay.append(agent_delay)
+                probability.append(agent_probability)
+                time_reveal.append(time_estimate - time_reveal_epsilon - self.global_delay - agent_delay)
+                factor.append(agent_factor)
+                agent_id += 1
+
+        self.unique_ids = unique_ids
+        self.code = np.array(code, dtype=np.int8)
+        self.pm = np.array(pm)
+        self.delay = np.rint(np.array(delay) * self.tick_scale).astype(np.int64)
+        self.probability = np.array(probability)
+        self.time_reveal = np.array(time_reveal, dtype=np.float64) * self.tick_scale
+        self.factor = np.array(factor, dtype=np.float64)
+
+    def setup_config_agents(self, config):
+        # Agents from a strategies.agents_from_config list instead of the seat layout of main_final.py, drawn from
+        # the global np.random stream
+        agents = agents_from_config(config, self.global_delay)
+        self.unique_ids = agents['unique_ids']
+        self.code = agents['code']
+        self.pm = agents['pm']
+        self.delay = np.rint(agents['delay'] * self.tick_scale).astype(np.int64)
+        self.probability = agents['probability']
+        self.time_reveal = agents['time_reveal'] * self.tick_scale
+        self.factor = agents['factor']
+
+    def setup_kernels(self):
+        code = self.code
+        self.kernels = StrategyKernels(code)
+        self.private_signal_value = np.zeros(len(code))
+        self.aggregated_signal = np.zeros(len(code))
+        self.bid = np.zeros(len(code))
+
+        # Each Player's bid queue holds delay + global_delay entries and releases once full, so the bid submitted at
+        # tick t is the one computed at tick t - queue_length + 1
+        self.queue_length = self.delay + int(round(self.global_delay * self.tick_scale))
+        if len(code) and self.queue_length.min() < 1:
+            raise ValueError("delay + global delay must be at least one tick")
+        self.agent_index = np.arange(len(code))
+
+    def setup_signals(self, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd,
+                      presample_signals=True, signal_stream=None):
+        # Initialize signal parameters
+        self.public_signal = 16
+        self.public_signal_value = 0.0011648
+        self.private_signal = 0
+        self.private_signal_max = 0
+        self.aggregated_signal_max = 0
+        # Sample until positive
+        while True:
+            self.public_lambda = norm.rvs(loc=rate_public_mean, scale=rate_public_sd)
+            if self.public_lambda > 0:
+                break
+        # Sample until positive
+        while True:
+            self.private_lambda = norm.rvs(loc=rate_private_mean, scale=rate_private_sd)
+            if self.private_lambda > 0:
+                break
+        # Draw the signals of every tick the auction runs for, like main_final.Auction
+        # A given stream (e.g. a slot of replay.TraceReplay at this resolution) replaces the draws
+        self.signal_stream = signal_stream
+        if signal_stream is not None:
+            self.signal_stream.draw_delivery(self.probability)
+        elif presample_signals:
+            self.signal_stream = sample_signal_stream(self.public_lambda / self.tick_scale,
+                                                      self.private_lambda / self.tick_scale, self.n_ticks,
+                                                      MAIN_FINAL_SIGNALS)
+            self.signal_stream.draw_delivery(self.probability)
+
+    def setup_bids(self):
+        # Ring buffer standing in for the per-agent deques, one row per tick of the longest queue
+        ring_size = int(self.queue_length.max()) if len(self.code) else 1
+        self.queued_bids = np.zeros((ring_size, len(self.code)))
+        self.queued_signals = np.zeros((ring_size, len(self.code)))
+        # Flat positions in the ring of the bids leaving the queues, for each ring row the tick is stored in
+        slots = np.arange(ring_size)[:, None]
+        self.release_positions = ((slots - self.queue_length + 1) % ring_size) * len(self.code) + self.agent_index
+        self.release_ticks = self.queue_length - 1
+        self.max_bids = []
+        self.winning_agents = []
+
+        # Bids are piecewise constant: an agent's bid can only change when a signal arrives, at its reveal time, or
+        # (Adaptive) after the relay's top bid changed. step() and run_events only run the kernels at those ticks, on
+        # the others the kernels would return the bids they are given
+        timed = np.isin(self.code, [strategy.code for strategy in STRATEGIES.values() if strategy.timed])
+        self.reveal_ticks = set(np.ceil(self.time_reveal[timed]).astype(np.int64).tolist())
+        self.follows_relay = bool(np.isin(self.code, [strategy.code for strategy in STRATEGIES.values()
+                                                      if strategy.follows_relay]).any())
+        self.arrival_ticks = set()
+        if self.signal_stream is not None:
+            self.arrival_ticks = set(self.signal_stream.arrival_ticks().tolist())
+        # Top bid on the relay when the kernels last ran
+        self.bid_relay = None
+
+    def setup_winner(self):
+        self.winner_profit = 0
+        self.winner_trueprofit = 0
+        self.winner_aggregated_signal = 0
+        self.winner_probability = 0
+        self.auction_efficiency = 0
+
+    def update_signals(self):
+        # Returns whether a signal arrived at this tick
+        if self.signal_stream is not None:
+            arrived = self.read_signals()
+        else:
+            arrived = self.sample_signals()
+        self.aggregated_signal_max = self.public_signal_value + self.private_signal_max
+        return arrived
+
+    def read_signals(self):
+        stream = self.signal_stream
+        self.public_signal = stream.public_signal[self.time]
+        self.public_signal_value = stream.public_signal_value[self.time]
+        self.private_signal = stream.private_signal[self.time]
+        self.private_signal_max = stream.private_signal_max[self.time]
+        arrived = self.time in self.arrival_ticks
+        if arrived:
+            self.private_signal_value += stream.private_increments(self.time)
+        return arrived
+
+    def sample_signals(self):
+        # Update public signal, adding values one at a time to keep the same rounding as the Mesa model
+        new_public_signal = np.random.poisson(self.public_lambda / self.tick_scale)
+        self.public_signal += new_public_signal
+        for signal_value in np.random.lognormal(mean=-9.85, sigma=0.80, size=new_public_signal):
+            self.public_signal_value += signal_value
+
+        # Update private signal
+        new_private_signal = np.random.poisson(self.private_lambda / self.tick_scale)
+        self.private_signal += new_private_signal
+        for private_signal_value in np.random.lognormal(mean=-8.45, sigma=0.85, size=new_private_signal):
+            self.private_signal_max += private_signal_value
+            # One coin flip per agent and signal, like the legacy path of the Mesa model
+            coin_flips = np.array([random.random() for _ in range(len(self.code))])
+            self.private_signal_value[coin_flips < self.probability] += private_signal_value
+        return new_public_signal + new_private_signal > 0
+
+    def update_bids(self):
+        # Array form of the step() methods of the Player subclasses, one kernel call per strategy
+        self.aggregated_signal = self.public_signal_value + self.private_signal_value
+        self.bid_relay = self.max_bids[-1] if self.max_bids else None
+        self.bid = self.kernels.bids(self.time, self.public_signal_value, self.private_signal_value, self.pm,
+                                     self.factor, self.time_reveal, self.bid,
+                                     self.max_bids[-1] if self.max_bids else 0.0, bool(self.max_bids))
+
+    def release_bids(self):
+        # Array form of Player.advance: store this tick's bids and gather the ones leaving their queues
+        slot = self.time % len(self.queued_bids)
+        self.queued_bids[slot] = self.bid
+        self.queued_signals[slot] = self.aggregated_signal
+        positions = self.release_positions[slot]
+        return (self.time >= self.release_ticks, self.queued_bids.take(positions),
+                self.queued_signals.take(positions))
+
+    def select_winner(self, released, bids, signals, ticks=1):
+        # ticks > 1 selects the winners of that many consecutive ticks with the same bids on the relay
+        if released.all():
+            max_bids = (bids == bids.max()).nonzero()[0]
+        elif released.any():
+            max_bids = (released & (bids == bids[released].max())).nonzero()[0]
+        else:
+            return
+        if ticks < BULK_TIE_BREAKS:
+            max_bids = max_bids.tolist()
+            for _ in range(ticks):
+                # Randomly select one of the maximum bids, from a list in agent order as in the Mesa model
+                winner = random.choice(max_bids)
+                self.max_bids.append(bids[winner])
+                self.winning_agents.append(self.unique_ids[winner])
+        elif len(max_bids) == 1:
+            # A single top bid wins every tick, the tie-breaks only advance the global stream
+            tie_breaks(1, ticks)
+            winner = max_bids[0]
+            self.max_bids.extend([bids[winner]] * ticks)
+            self.winning_agents.extend([self.unique_ids[winner]] * ticks)
+        else:
+            winners = max_bids[tie_breaks(len(max_bids), ticks)]
+            winner = winners[-1]
+            self.max_bids.extend(bids[winners].tolist())
+            self.winning_agents.extend(operator.itemgetter(*winners)(self.unique_ids))
+        self.winner_profit = signals[winner] - bids[winner]
+        if self.aggregated_signal_max == 0:
+            self.auction_efficiency = 0
+        else:
+            self.auction_efficiency = bids[winner] / self.aggregated_signal_max
+        self.winner_aggregated_signal = signals[winner]
+        self.winner_probability = self.probability[winner]
+
+    def step(self):
+        arrived = self.update_signals()
+        relay = self.max_bids[-1] if self.max_bids else None
+        if (arrived or self.time == 0 or self.time in self.reveal_ticks or
+                (self.follows_relay and relay != self.bid_relay)):
+            self.update_bids()
+        self.select_winner(*self.release_bids())
+        self.time += 1
+
+    def run(self, event_driven=False):
+        # Run the auction to its end, either tick by tick like runscript.py or jumping between events
+        if event_driven:
+            self.run_events()
+        else:
+            while self.time < self.n_ticks:
+                self.step()
+
+    def run_events(self):
+        # Discrete-event version of running every tick. Besides the ticks where a bid can change (see setup_bids), the
+        # relay only sees a change once the changed bid leaves its queue. Only those ticks are evaluated, so the cost
+        # follows the number of events instead of the number of ticks. The relay's random tie-breaks of the skipped
+        # ticks are still drawn, which keeps the results and the global random stream the same as stepping every tick.
+        if self.signal_stream is None:
+            raise ValueError("event-driven runs need pre-sampled signals")
+        n_ticks = self.n_ticks
+        if self.time != 0 or n_ticks == 0:
+            raise ValueError("event-driven runs start from a fresh auction")
+
+        release_ticks = self.queue_length - 1
+        events = {0, n_ticks - 1}
+        for ticks in (self.arrival_ticks, self.reveal_ticks, release_ticks):
+            events.update(int(tick) for tick in ticks if 0 <= tick < n_ticks)
+        events = list(events)
+        heapq.heapify(events)
+        scheduled = set(events)
+
+        # Bids and signals as of every evaluated tick, grown by doubling
+        n_agents = len(self.code)
+        event_ticks = np.zeros(64, dtype=np.int64)
+        bid_history = np.zeros((64, n_agents))
+        signal_history = np.zeros((64, n_agents))
+        n_events = 0
+
+        def schedule(tick):
+            if tick < n_ticks and tick not in scheduled:
+                scheduled.add(tick)
+                heapq.heappush(events, tick)
+
+        while events:
+            self.time = heapq.heappop(events)
+            previous_bid, previous_signal = self.bid, self.aggregated_signal
+            self.update_signals()
+            self.update_bids()
+
+            if n_events == len(event_ticks):
+                event_ticks = np.concatenate((event_ticks, np.zeros_like(event_ticks)))
+                bid_history = np.concatenate((bid_history, np.zeros_like(bid_history)))
+                signal_history = np.concatenate((signal_history, np.zeros_like(signal_history)))
+            event_ticks[n_events] = self.time
+            bid_history[n_events] = self.bid
+            signal_history[n_events] = self.aggregated_signal
+            n_events += 1
+
+            # A changed bid reaches the relay once it leaves the agent's queue
+            changed = (self.bid != previous_bid) | (self.aggregated_signal != previous_signal)
+            for tick in np.unique(self.time + self.queue_length[changed] - 1):
+                schedule(int(tick))
+
+            released = self.time >= self.queue_length - 1
+            rows = np.searchsorted(event_ticks[:n_events], self.time - self.queue_length + 1, side='right') - 1
+            bids = bid_history[rows, self.agent_index]
+            signals = signal_history[rows, self.agent_index]
+            if self.follows_relay and released.any() and (not self.max_bids or bids[released].max() != self.max_bids[-1]):
+                schedule(self.time + 1)
+            # The relay sees the same bids until the next event
+            next_event = events[0] if events else n_ticks
+            self.select_winner(released, bids, signals, ticks=next_event - self.time)
+
+        self.time = n_ticks
+
+
+def tie_breaks(n_tied, count):
+    # Indices that count calls of random.choice on n_tied candidates would return, drawn in bulk from the global
+    # random module. random.choice takes getrandbits(k) with k = n_tied.bit_length(), the top k bits of one 32-bit
+    # word, until the value is below n_tied (this consumes words even when n_tied is 1, and accepts at least half of
+    # them). getrandbits(32 * m) returns the next m words, lowest first: enough words are read to find the count-th
+    # accepted one, then the state is rewound and advanced by exactly the words the calls would have used
+    shift = 32 - n_tied.bit_length()
+    state = random.getstate()
+    n_words = 2 * count + 32
+    while True:
+        words = np.frombuffer(random.getrandbits(32 * n_words).to_bytes(4 * n_words, 'little'), dtype='<u4')
+        values = (words >> shift).astype(np.int64)
+        accepted = np.flatnonzero(values < n_tied)
+        random.setstate(state)
+        if len(accepted) >= count:
+            break
+        n_words *= 2
+    random.getrandbits(32 * (int(accepted[count - 1]) + 1))
+    return values[accepted[:count]]
+
+
+def positive_normal(rng, mean, sd, size):
+    # Vectorized version of the "sample until positive" loops in Auction.setup_signals
+    values = rng.normal(mean, sd, size)
+    redraw = values <= 0
+    while redraw.any():
+        values[redraw] = rng.normal(mean, sd, redraw.sum())
+        redraw = values <= 0
+    return values
+
+
+def sample_agents(n_auctions, global_delay, rng, time_reveal_epsilon=None, stealth_factor=None, bluff_factor=None):
+    # Batch version of main_final.Auction.setup_agents, one row of seats per auction. time_reveal_epsilon,
+    # stealth_factor and bluff_factor replace the defaults of the timed strategies when given, e.g. in a sweep
+    shape = (n_auctions, len(SEAT_STRATEGIES))
+    seat = np.arange(len(SEAT_STRATEGIES))
+    code = np.broadcast_to(np.array(SEAT_STRATEGIES, dtype=np.int8), shape)
+
+    pm_low = np.where(seat % 2 == 0, 0.005, 0.007)
+    pm = rng.uniform(pm_low, pm_low + 0.002, shape)
+    delay = rng.integers(0, 3, shape) * 10 + np.where(seat % 4 < 2, 0, 30)
+    probability_low = np.where(seat < 4, 0.8, 0.9)
+    probability = rng.uniform(probability_low, probability_low + 0.1, shape)
+
+    adaptive = seat == 8
+    pm[:, adaptive] = rng.uniform(0.005, 0.009, (n_auctions, 1))
+    delay[:, adaptive] = rng.integers(0, 6, (n_auctions, 1)) * 10
+    probability[:, adaptive] = rng.uniform(0.8, 1.0, (n_auctions, 1))
+
+    # The default factors are always drawn, so overriding one leaves the other draws unchanged
+    stealth = rng.uniform(0.8, 1, shape)
+    bluff = rng.uniform(1, 1.2, shape)
+    if stealth_factor is not None:
+        stealth = np.full(shape, float(stealth_factor))
+    if bluff_factor is not None:
+        bluff = np.full(shape, float(bluff_factor))
+    factor = np.where(code == STEALTH, stealth, 0.0)
+    factor = np.where(code == BLUFF, bluff, factor)
+    if time_reveal_epsilon is None:
+        time_reveal_epsilon = np.where(code == BLUFF, 100, 0)
+    time_reveal = 1200 - time_reveal_epsilon - global_delay - delay
+
+    return {'code': code, 'pm': pm, 'delay': delay, 'probability': probability,
+            'time_reveal': time_reveal.astype(np.float64), 'factor': factor}
+
+
+def simulate_chunk(counts, delay, rate_public_mean, rate_public_sd, rate_private_mean, rate_private_sd,
+                   T_mean, T_sd, rng, agent_params=None, agent_config=None, signal_source=None, auction_index=None,
+                   common=None, T=None, signal_params=MAIN_FINAL_SIGNALS, bid_timing=False):
+    # auction_index numbers the auctions for the signal source and common random numbers, T gives durations drawn
+    # by the caller
+    n_auctions = len(counts)
+    if auction_index is None:
+        auction_index = np.arange(n_auctions)
+    if common is not None and signal_source is not None:
+        raise ValueError("common random numbers draw their own signals, they cannot replay a signal source")
+    if agent_config is None:
+        if (counts.sum(axis=1) > len(SEAT_STRATEGIES)).any():
+            # As VectorAuction.setup_agents: main_final has no seat past the ninth
+            raise ValueError("agent already added to scheduler")
+        agents = sample_agents(n_auctions, delay, rng, **(agent_params or {}))
+        # main_final only fills the first sum(N, A, L, S, B) seats
+        active = np.arange(agents['code'].shape[1]) < counts.sum(axis=1)[:, None]
+    else:
+        agents = agents_from_config(agent_config, delay, rng, n_auctions)
+        active = np.ones(agents['code'].shape, dtype=bool)
+    code = agents['code']
+    n_seats = code.shape[1]
+    kernels = StrategyKernels(code)
+    prefixes = strategy_prefixes()
+    queue_length = agents['delay'] + delay
+    if (queue_length[active] < 1).any():
+        raise ValueError("delay + global delay must be at least one tick")
+
+    if common is not None:
+        # Duration, rates, signals and delivery of every auction come from its common stream, keyed by its index
+        draws = common.draw(auction_index, n_seats, rate_public_mean, rate_public_sd,
+                            rate_private_mean, rate_private_sd, T_mean, T_sd, signal_params)
+        T = draws['T']
+    elif T is None:
+        T = T_mean + T_sd * rng.standard_normal(n_auctions)
+    n_ticks = np.maximum((T * 100).astype(np.int64), 0)
+    max_ticks = int(n_ticks.max()) if n_auctions else 0
+    if common is None:
+        public_lambda = positive_normal(rng, rate_public_mean, rate_public_sd, n_auctions)
+        private_lambda = positive_normal(rng, rate_private_mean, rate_private_sd, n_auctions)
+
+    # Draw every signal of the chunk up front, as (auctions x ticks) arrays, or take them from the signal source
+    if common is not None:
+        public_value, private_max, private_values, signal_auction, signal_tick = draws['signals']
+    elif signal_source is None:
+        public_value, private_max, private_values, signal_auction, signal_tick = sample_signal_batch(
+            public_lambda, private_lambda, max_ticks, signal_params, rng)
+    else:
+        public_value, private_max, private_values, signal_auction, signal_tick = signal_source.signal_batch(
+            auction_index, max_ticks, signal_params)
+
+    # Deliver each private signal to every agent with its probability, then order the signals by tick
+    uniforms = draws['delivery'] if common is not None else rng.random((len(private_values), n_seats))
+    delivered = uniforms < agents['probability'][signal_auction]
+    contributions = private_values[:, None] * delivered
+
+    # Run the auctions longest first: the auctions still running at tick t are then the first alive[t] rows, and
+    # finished ones drop out of every array operation instead of being masked until the longest auction ends. The
+    # stable sort keeps auctions of equal length, which end at the same tick, in their original order
+    by_length = np.argsort(-n_ticks, kind='stable')
+    rank = np.empty(n_auctions, dtype=np.int64)
+    rank[by_length] = np.arange(n_auctions)
+    alive = np.searchsorted(-n_ticks[by_length], -np.arange(max_ticks + 1), side='left')
+    active, queue_length = active[by_length], queue_length[by_length]
+    code, probability = code[by_length], agents['probability'][by_length]
+    pm, factor, time_reveal = (agents[name][by_length] for name in ['pm', 'factor', 'time_reveal'])
+    public_value, private_max = public_value[by_length], private_max[by_length]
+    # Signals arriving after their auction ended are never read
+    running = signal_tick < n_ticks[signal_auction]
+    signal_row, signal_tick, contributions = rank[signal_auction[running]], signal_tick[running], contributions[running]
+    order = np.argsort(signal_tick, kind='stable')
+    signal_row, contributions = signal_row[order], contributions[order]
+    tick_offsets = np.searchsorted(signal_tick[order], np.arange(max_ticks + 1))
+
+    rows = np.arange(n_auctions)[:, None]
+    seats = np.arange(n_seats)
+    ring_size = int(queue_length.max()) if queue_length.size else 1
+    queued_bids = np.zeros((ring_size, n_auctions, n_seats))
+    queued_signals = np.zeros((ring_size, n_auctions, n_seats))
+    if bid_timing:
+        # Tick at which each queued bid was last changed by its agent
+        changed_at = np.zeros((n_auctions, n_seats), dtype=np.int64)
+        queued_changes = np.zeros((ring_size, n_auctions, n_seats), dtype=np.int64)
+    private_signal_value = np.zeros((n_auctions, n_seats))
+    bid = np.zeros((n_auctions, n_seats))
+    last_max = np.zeros((n_auctions, 1))
+    has_max = np.zeros((n_auctions, 1), dtype=bool)
+
+    results = {
+        'winning_agent': np.full(n_auctions, None, dtype=object),
+        'winning_bid_value': np.full(n_auctions, np.nan),
+        'winner_aggregated_signal': np.full(n_auctions, np.nan),
+        'signal_max': np.full(n_auctions, np.nan),
+        'Profit': np.full(n_auctions, np.nan),
+        'Probability': np.full(n_auctions, np.nan),
+        'efficiency': np.full(n_auctions, np.nan),
+    }
+    if bid_timing:
+        results['winning_bid_tick'] = np.full(n_auctions, -1, dtype=np.int64)
+
+    for t in range(max_ticks):
+        n = alive[t]
+        start, end = tick_offsets[t], tick_offsets[t + 1]
+        if end > start:
+            np.add.at(private_signal_value, signal_row[start:end], contributions[start:end])
+
+        # Same strategy kernels as VectorAuction.update_bids, broadcast over the running auctions
+        public = public_value[:n, t:t + 1]
+        signal_value = private_signal_value[:n]
+        aggregated_signal = public + signal_value
+        new_bid = kernels.bids(t, public, signal_value, pm[:n], factor[:n], time_reveal[:n], bid[:n], last_max[:n],
+                               has_max[:n])
+        if bid_timing:
+            changed_at[:n] = np.where(new_bid != bid[:n], t, changed_at[:n])
+            queued_changes[t % ring_size, :n] = changed_at[:n]
+        bid[:n] = new_bid
+
+        queued_bids[t % ring_size, :n] = bid[:n]
+        queued_signals[t % ring_size, :n] = aggregated_signal
+        released = active[:n] & (t >= queue_length[:n] - 1)
+        ring_rows = (t - queue_length[:n] + 1) % ring_size
+        released_bids = queued_bids[ring_rows, rows[:n], seats]
+        has_bids = released.any(axis=1, keepdims=True)
+        max_bid = np.where(released, released_bids, -np.inf).max(axis=1, keepdims=True)
+        last_max[:n] = np.where(has_bids, max_bid, last_max[:n])
+        has_max[:n] |= has_bids
+
+        # Record the result of the auctions whose last tick this is, the last rows still running
+        ending = alive[t + 1] + np.flatnonzero(has_bids[alive[t + 1]:, 0])
+        if ending.size:
+            ties = released[ending] & (released_bids[ending] == max_bid[ending])
+            winner = np.where(ties, rng.random(ties.shape), -1).argmax(axis=1)
+            winning_bid = released_bids[ending, winner]
+            winner_signal = queued_signals[ring_rows[ending, winner], ending, winner]
+            signal_max = public_value[ending, t] + private_max[ending, t]
+            auctions = by_length[ending]
+            results['winning_agent'][auctions] = [prefixes[c] + str(w) for c, w in zip(code[ending, winner], winner)]
+            results['winning_bid_value'][auctions] = winning_bid
+            results['winner_aggregated_signal'][auctions] = winner_signal
+            results['signal_max'][auctions] = signal_max
+            results['Profit'][auctions] = winner_signal - winning_bid
+            results['Probability'][auctions] = probability[ending, winner]
+            results['efficiency'][auctions] = np.where(signal_max == 0, 0,
+                                                       winning_bid / np.where(signal_max == 0, 1, signal_max))
+            if bid_timing:
+                # Tick the winning bid reached the relay: when it was set plus its queue
+                results['winning_bid_tick'][auctions] = (queued_changes[ring_rows[ending, winner], ending, winner] +
+                                                         queue_length[ending, winner] - 1)
+
+    results['True Profit'] = np.zeros(n_auctions)
+    results['auction_time'] = n_ticks - 1
+    for column, count in zip(['N', 'A', 'L', 'S', 'B'], counts.T):
+        results[column] = count
+    results['Delay'] = np.full(n_auctions, delay)
+    return pd.DataFrame(results, columns=RESULT_COLUMNS + (['winning_bid_tick'] if bid_timing else []))
+
+
+def simulate_batch(strategies, n_auctions, delay=10, rate_public_mean=0.08183, rate_public_sd=0.0371,
+                   rate_private_mean=0.04404, rate_private_sd=0.0241, T_mean=12, T_sd=0, rng=None,
+                   chunk_size=1000, agents=None, signal_source=None, common=None, first_auction=0,
+                   signal_params=MAIN_FINAL_SIGNALS, bid_timing=False, **agent_params):
+    # Run n_auctions independent auctions as (auctions x seats) array computations and return one row per auction
+    # with the columns of run_simulation. strategies is a {'N': .., 'A': .., 'L': .., 'S': .., 'B': ..} dict shared
+    # by every auction, or a list with one such dict per auction. chunk_size bounds the memory of the signal arrays.
+    # agent_params (time_reveal_epsilon, stealth_factor, bluff_factor) are passed on to sample_agents. agents is an
+    # optional strategies.agents_from_config list that replaces the seat layout; strategies is then ignored and the
+    # N..B columns count the config's agents. signal_source, e.g. a replay.SlotSource, supplies the signals of
+    # auctions by index through signal_batch(auctions, n_ticks, params) instead of the Poisson/lognormal draws.
+    # common, a common_random.CommonRandomNumbers, draws the duration, signals and delivery of each auction from a
+    # stream keyed by its index, so runs of different configurations see the same auctions. first_auction is the
+    # index of the first auction, for runs split into several calls. With T_sd > 0 the durations are drawn up front
+    # and the auctions are split into chunks of similar length, so a chunk does not run many ticks for a few long
+    # auctions; the rows still come back in auction order. signal_params replaces the lognormal signal value
+    # constants of main_final.py, and bid_timing adds the winning_bid_tick column, the tick the winning bid reached
+    # the relay.
+    if rng is None:
+        rng = np.random.default_rng()
+    if agents is not None:
+        config_counts = {prefix: 0 for prefix in STRATEGY_PREFIXES}
+        for entry in agents:
+            prefix = get_strategy(entry['strategy']).prefix
+            if prefix in config_counts:
+                config_counts[prefix] += entry.get('count', 1)
+        strategies = config_counts
+    if isinstance(strategies, dict):
+        strategies = [strategies] * n_auctions
+    counts = np.array([list(mix.values()) for mix in strategies], dtype=np.int64).reshape(-1, 5)
+    if len(counts) != n_auctions:
+        raise ValueError(f"expected {n_auctions} strategy mixes, got {len(counts)}")
+
+    T = None
+    by_length = np.arange(n_auctions)
+    if T_sd > 0 and common is None:
+        # Length buckets: the durations are drawn here and the chunks take the auctions in order of length
+        T = T_mean + T_sd * rng.standard_normal(n_auctions)
+        by_length = np.argsort(np.maximum((T * 100).astype(np.int64), 0), kind='stable')
+    chunks = []
+    for start in range(0, n_auctions, chunk_size):
+        auctions = by_length[start:start + chunk_size]
+        chunks.append(simulate_chunk(counts[auctions], delay, rate_public_mean, rate_public_sd, rate_private_mean,
+                                     rate_private_sd, T_mean, T_sd, rng, agent_params, agents, signal_source,
+                                     first_auction + auctions, common, None if T is None else T[auctions],
+                                     signal_params, bid_timing))
+    if not chunks:
+        return pd.DataFrame(columns=RESULT_COLUMNS + (['winning_bid_tick'] if bid_timing else []))
+    frame = pd.concat(chunks, ignore_index=True)
+    if T is not None:
+        frame.index = by_length
+        frame = frame.sort_index().reset_index(drop=True)
+    return frame
@@ -0,0 +1,262 @@
+# Description: Work queue for running sweeps on several machines that share a directory (e.g. an NFS volume), with
+# no broker. enqueue writes one task file per chunk of auctions of a sweep; any number of workers on any node claim
+# tasks by creating a lease file next to them, keep the lease alive while the chunk runs, and write the chunk's
+# results under the same names run_sweep caches them under. A lease that is not renewed in time (a crashed or
+# disconnected worker) expires and the task is claimed again. Chunks are seeded like run_sweep, so a chunk computed
+# twice gives the same rows and the results do not depend on which worker ran what.
+
+import argparse
+import glob
+import json
+import os
+import socket
+import threading
+import time
+import numpy as np
+import pandas as pd
+from campaign import chunk_sizes, write_atomic
+from common_random import CommonRandomNumbers
+from results import read_results, write_results
+from sweep import (add_space_arguments, chunk_path, chunk_seeds, point_key, points_from_arguments, run_point_chunk,
+                   save_chunk)
+from vector_engine import RESULT_COLUMNS
+
+
+def task_path(directory, task_id):
+    return os.path.join(directory, 'tasks', f'{task_id}.json')
+
+
+def lease_path(directory, task_id):
+    return os.path.join(directory, 'leases', f'{task_id}.lease')
+
+
+def enqueue_sweep(directory, points, runs_per_point, seed=0, chunk_size=250, manual_values=None,
+                  common_random=False):
+    # Write a task for every chunk of every point whose results are not in the directory yet
+    os.makedirs(os.path.join(directory, 'tasks'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'leases'), exist_ok=True)
+    sizes = chunk_sizes(runs_per_point, chunk_size)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(int)
+    keys = [point_key(point, runs_per_point, seed, chunk_size, manual_values, common_random) for point in points]
+    queued = 0
+    for point, key in zip(points, keys):
+        for chunk, (size, child) in enumerate(zip(sizes, chunk_seeds(key, seed, len(sizes), common_random))):
+            task_id = f'{key}-{chunk:06d}'
+            if os.path.exists(chunk_path(directory, key, chunk)) or os.path.exists(task_path(directory, task_id)):
+                continue
+            task = {'point': point, 'key': key, 'chunk': chunk, 'size': size, 'first_auction': int(starts[chunk]),
+                    'entropy': str(child.entropy), 'spawn_key': list(child.spawn_key),
+                    'manual_values': manual_values, 'common_seed': seed if common_random else None}
+            write_atomic(task_path(directory, task_id), lambda path: write_json(path, task))
+            queued += 1
+
+    # The keys of every enqueued sweep, for collect_results
+    manifest = os.path.join(directory, 'queue.json')
+    previous = read_json(manifest)['keys'] if os.path.exists(manifest) else []
+    write_atomic(manifest, lambda path: write_json(path, {'keys': list(dict.fromkeys(previous + keys))}))
+    return queued
+
+
+def write_json(path, value):
+    with open(path, 'w') as file:
+        json.dump(value, file)
+
+
+def read_json(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def task_chunk(task_id):
+    # Point key and chunk index of a task, from its id f'{key}-{chunk:06d}'
+    key, chunk = task_id.rsplit('-', 1)
+    return key, int(chunk)
+
+
+def is_done(directory, task_id):
+    return os.path.exists(chunk_path(directory, *task_chunk(task_id)))
+
+
+def lease_owner(path):
+    # Worker id recorded in a lease, None when there is no lease or it is still being written
+    try:
+        return read_json(path)['worker']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def lease_expired(path, lease_seconds):
+    try:
+        return time.time() - os.stat(path).st_mtime > lease_seconds
+    except FileNotFoundError:
+        return True
+
+
+def try_lease(directory, task_id, worker_id, lease_seconds):
+    # Create the lease file exclusively. An expired lease is first moved aside, which only one worker can do. In the
+    # rare race where two workers still end up running a task, both write the same rows atomically
+    path = lease_path(directory, task_id)
+    if os.path.exists(path):
+        if not lease_expired(path, lease_seconds):
+            return False
+        try:
+            os.rename(path, f'{path}.expired-{worker_id}')
+        except FileNotFoundError:
+            return False
+        os.remove(f'{path}.expired-{worker_id}')
+    try:
+        descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(descriptor, 'w') as file:
+        json.dump({'worker': worker_id, 'claimed': time.time()}, file)
+    return True
+
+
+class Worker:
+    def __init__(self, directory, worker_id=None, lease_seconds=300):
+        # Clocks of the nodes must roughly agree: leases expire lease_seconds after their last renewal
+        self.directory = directory
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.lease_seconds = lease_seconds
+        # Tasks seen done; a chunk once written stays done, so they are not checked again
+        self.done = set()
+
+    def claim(self):
+        # Lease the first task that is neither done nor leased, return (task_id, task) or None. Whether a task is
+        # done follows from its id, so only the file of the task that is leased is read
+        for path in sorted(glob.glob(os.path.join(self.directory, 'tasks', '*.json'))):
+            task_id = os.path.basename(path)[:-len('.json')]
+            if task_id in self.done:
+                continue
+            if is_done(self.directory, task_id):
+                self.done.add(task_id)
+                continue
+            if try_lease(self.directory, task_id, self.worker_id, self.lease_seconds):
+                if not is_done(self.directory, task_id):
+                    return task_id, read_json(path)
+                self.release(task_id)
+        return None
+
+    def release(self, task_id):
+        # Remove the lease only while it is this worker's: once it expired another worker may have leased the task.
+        # The lease is moved aside before its owner is read, so it cannot be taken over in between; a lease that
+        # turns out to be another worker's is linked back, unless the task was leased again meanwhile
+        path = lease_path(self.directory, task_id)
+        released = f'{path}.released-{self.worker_id}'
+        try:
+            os.rename(path, released)
+        except FileNotFoundError:
+            return
+        if lease_owner(released) != self.worker_id:
+            try:
+                os.link(released, path)
+            except FileExistsError:
+                pass
+        os.remove(released)
+
+    def keep_alive(self, task_id, stop):
+        # Renew the lease by touching it until the task is finished. Stop once the lease is gone or another worker
+        # holds it, the task then runs twice and both runs write the same rows
+        path = lease_path(self.directory, task_id)
+        while not stop.wait(self.lease_seconds / 3):
+            if lease_owner(path) != self.worker_id:
+                return
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return
+
+    def run_task(self, task_id, task):
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self.keep_alive, args=(task_id, stop), daemon=True)
+        heartbeat.start()
+        try:
+            seed_sequence = np.random.SeedSequence(int(task['entropy']), spawn_key=tuple(task['spawn_key']))
+            common = CommonRandomNumbers(task['common_seed']) if task['common_seed'] is not None else None
+            frame = run_point_chunk(task['point'], task['size'], seed_sequence, task['manual_values'], common,
+                                    task['first_auction'])
+            save_chunk(self.directory, task['key'], task['chunk'], frame)
+        finally:
+            stop.set()
+            heartbeat.join()
+            self.release(task_id)
+
+    def run(self, max_tasks=None, wait=False, poll_seconds=10):
+        # Work until no task is left (or max_tasks are done). With wait, keep polling for tasks whose lease may still
+        # expire and for tasks enqueued later, and stop only once every task is done
+        done = 0
+        while max_tasks is None or done < max_tasks:
+            claimed = self.claim()
+            if claimed is None:
+                status = queue_status(self.directory, self.lease_seconds)
+                if wait and status['pending'] + status['leased']:
+                    time.sleep(poll_seconds)
+                    continue
+                break
+            self.run_task(*claimed)
+            done += 1
+        return done
+
+
+def queue_status(directory, lease_seconds=300):
+    status = {'done': 0, 'leased': 0, 'expired': 0, 'pending': 0}
+    for path in glob.glob(os.path.join(directory, 'tasks', '*.json')):
+        task_id = os.path.basename(path)[:-len('.json')]
+        if is_done(directory, task_id):
+            status['done'] += 1
+        elif not os.path.exists(lease_path(directory, task_id)):
+            status['pending'] += 1
+        elif lease_expired(lease_path(directory, task_id), lease_seconds):
+            status['expired'] += 1
+        else:
+            status['leased'] += 1
+    # Expired tasks are claimed again like pending ones
+    status['pending'] += status['expired']
+    return status
+
+
+def collect_results(directory):
+    # Rows of every finished chunk of the enqueued sweeps, in the order run_sweep returns them
+    keys = read_json(os.path.join(directory, 'queue.json'))['keys']
+    frames = [read_results(path) for key in keys
+              for path in sorted(glob.glob(os.path.join(directory, f'point-{key}-*.parquet')))]
+    if not frames:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shared-directory work queue for sweeps across machines")
+    commands = parser.add_subparsers(dest='command', required=True)
+    enqueue = commands.add_parser('enqueue', help="queue the chunks of a sweep")
+    add_space_arguments(enqueue)
+    enqueue.add_argument('--runs', type=int, default=1000, help="auctions per point")
+    enqueue.add_argument('--common-random', action='store_true')
+    work = commands.add_parser('work', help="claim and run tasks until the queue is empty")
+    work.add_argument('directory')
+    work.add_argument('--lease', type=float, default=300, help="seconds before an unrenewed lease expires")
+    work.add_argument('--max-tasks', type=int, default=None)
+    work.add_argument('--wait', action='store_true', help="wait for leased tasks to finish or expire")
+    status = commands.add_parser('status', help="count done, leased and pending tasks")
+    status.add_argument('directory')
+    status.add_argument('--lease', type=float, default=300)
+    collect = commands.add_parser('collect', help="merge the results of the finished chunks")
+    collect.add_argument('directory')
+    collect.add_argument('--output', default='sweep_results.parquet')
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        points = points_from_arguments(args)
+        queued = enqueue_sweep(args.directory, points, args.runs, seed=args.seed, chunk_size=args.chunk_size,
+                               common_random=args.common_random)
+        print(f'Queued {queued} chunks of {len(points)} points in {args.directory}')
+    elif args.command == 'work':
+        done = Worker(args.directory, lease_seconds=args.lease).run(args.max_tasks, args.wait)
+        print(f'Ran {done} chunks')
+    elif args.command == 'status':
+        print(queue_status(args.directory, args.lease))
+    else:
+        results = collect_results(args.directory)
+        write_results(results, args.output, columns=results.columns)
+        print(f'Results of {len(results)} auctions saved to {args.output}')